@@ -0,0 +1,236 @@
+"""
+Keep-alive HTTP connection pooling for ThoughtFlow.
+
+A tiny stdlib-only pool (http.client) that reuses open connections per
+(scheme, host, port), so repeated calls to the same provider skip the TCP
+and TLS handshakes that urllib.request.urlopen pays on every request.
+
+The pool connects straight to the target host and does not speak to HTTP
+proxies; callers check uses_proxy(url) and send proxied requests through
+urllib.request, which honours HTTP(S)_PROXY / NO_PROXY.
+"""
+
+from __future__ import annotations
+
+import ssl
+import select
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+
+
+# Errors that mean a reused keep-alive connection was closed by the server
+# while idle. A request is retried once on a fresh connection only when it
+# provably was not processed: sending it failed, or the server hung up
+# without a single byte of response (RemoteDisconnected). A garbled or
+# reset response is never retried, since a POST may already have run.
+_SEND_STALE_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+
+def uses_proxy(url):
+    """
+    True if urllib.request would send a request for url through a proxy.
+
+    Mirrors urllib's ProxyHandler: a proxy configured for the URL's scheme
+    (HTTP_PROXY, HTTPS_PROXY, ...) applies unless NO_PROXY bypasses the host.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in urllib.request.getproxies():
+        return False
+    return not urllib.request.proxy_bypass(parts.netloc)
+
+
+def _is_dropped(conn):
+    """True if an idle connection's socket is closed or has unexpected data."""
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    # An idle keep-alive socket has nothing to read until we send a request;
+    # readable means EOF (server closed it) or stray bytes.
+    return bool(readable)
+
+
+class ConnectionPool:
+    """
+    Reuse HTTP(S) connections across requests to the same host.
+
+    Thread-safe: each request checks out its own connection, so concurrent
+    callers never share a socket. At most ``maxsize`` idle connections are
+    kept per host; extras are closed on release.
+
+    Example:
+        >>> pool = ConnectionPool()
+        >>> status, body = pool.request("POST", url, body=data, headers=headers)
+        >>> pool.close()
+    """
+
+    def __init__(self, maxsize=4, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = {}   # (scheme, host, port) -> list of idle connections
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key):
+        """Return (connection, reused) for the given host key."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                return self._new_connection(key), False
+            if not _is_dropped(conn):
+                return conn, True
+            # Closed by the server while idle: discard before sending anything
+            conn.close()
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method, url, body, headers):
+        """Send a request and return (key, connection, response) unread."""
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        headers = headers or {}
+        conn, reused = self._acquire(key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+        except _SEND_STALE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+        else:
+            try:
+                return key, conn, conn.getresponse()
+            except http.client.RemoteDisconnected:
+                conn.close()
+                if not reused:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+        # The server dropped the idle connection before handling the
+        # request; retry once on a new one, closing it if that fails too.
+        conn = self._new_connection(key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        return key, conn, response
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request and read the full response.
+
+        Args:
+            method: HTTP method, e.g. "POST".
+            url: Absolute http(s) URL.
+            body: Request body bytes (or None).
+            headers: Dict of request headers.
+
+        Returns:
+            tuple: (status_code, response_body_bytes)
+
+        Raises:
+            OSError / http.client.HTTPException on transport failure.
+        """
+        key, conn, response = self._send(method, url, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return response.status, data
+
+    def stream(self, method, url, body=None, headers=None):
+        """
+        Send a request and return the response unread, for incremental reads.
+
+        The connection returns to the pool when the response is closed after
+        being read to the end; a response abandoned part-way closes its
+        connection instead, so no unread bytes leak into the next request.
+
+        Args:
+            method, url, body, headers: As for request().
+
+        Returns:
+            PooledResponse: Supports .status, .read(amt) and .close().
+        """
+        key, conn, response = self._send(method, url, body, headers)
+        return PooledResponse(self, key, conn, response)
+
+    def close(self):
+        """Close every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class PooledResponse:
+    """A streamed response whose connection goes back to its pool on close()."""
+
+    def __init__(self, pool, key, conn, response):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.status = response.status
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        response = self._response
+        if response.isclosed() and not response.will_close:
+            self._pool._release(self._key, conn)
+        else:
+            response.close()
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
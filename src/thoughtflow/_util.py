@@ -11,16 +11,31 @@ from __future__ import annotations
 
 ### IMPORTS AND SETTINGS
 
-import time, pickle, json
+import sys, time, pickle, json
 import re, ast
 from typing import Mapping, Any, Iterable, Optional, Tuple, Union
 
 import hashlib
-from random import randint
-from functools import reduce
+import random
+import threading
+from functools import lru_cache
 
 from zoneinfo import ZoneInfo
 
+try:
+    import orjson as _orjson  # Optional accelerator: pip install thoughtflow[fast]
+except ImportError:
+    _orjson = None
+
+# Dedicated generator for stamp/prompt randomness: skips randint's extra
+# call layer and is unaffected by user code reseeding the global random.
+_rng = random.Random()
+
+# Last tick handed out by EventStamp.stamp(); keeps stamps strictly
+# increasing in creation order even when several land in one 0.1 ms tick.
+_last_tick = 0
+_tick_lock = threading.Lock()
+
 tz_bog = ZoneInfo("America/Bogota")
 tz_utc = ZoneInfo("UTC")
 
@@ -45,25 +60,40 @@ class EventStamp:
     
     CHARSET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
     
+    @staticmethod
     def sha256_hash(input_string):
-        """Generate a SHA-256 hash and return it as an integer."""
-        hash_bytes = hashlib.sha256(input_string.encode("utf-8")).digest()
+        """
+        Generate a SHA-256 hash and return it as an integer.
+        
+        SHA-256 is kept deliberately even though no cryptographic property is
+        needed: hashify() digests are persisted as record/replay exchange keys,
+        so a faster third-party hash would invalidate existing recordings and
+        add a dependency.
+        
+        The digest is flagged usedforsecurity=False so FIPS-enabled OpenSSL
+        builds take their plain (SHA-NI accelerated) path.
+        """
+        hash_bytes = hashlib.sha256(input_string.encode("utf-8"), usedforsecurity=False).digest()
         return int.from_bytes(hash_bytes, byteorder="big")
     
+    @staticmethod
     def base62_encode(number, length):
         """Encode an integer into a fixed-length Base62 string."""
-        base = len(EventStamp.CHARSET)
-        encoded = []
-        for _ in range(length):
-            number, remainder = divmod(number, base)
-            encoded.append(EventStamp.CHARSET[remainder])
-        return ''.join(encoded[::-1])  # Reverse to get correct order
+        buf = bytearray(length)
+        for i in range(length - 1, -1, -1):  # Fill from the right, no reverse
+            number, remainder = divmod(number, 62)
+            buf[i] = _CHARSET_B[remainder]
+        return buf.decode('ascii')
     
+    @staticmethod
     def hashify(input_string, length=32):
         """Generate a deterministic hash using all uppercase/lowercase letters and digits."""
+        if len(input_string) <= _HASHIFY_CACHE_MAX_LEN:
+            return _hashify_cached(input_string, length)
         hashed_int = EventStamp.sha256_hash(input_string)
         return EventStamp.base62_encode(hashed_int, length)
     
+    @staticmethod
     def encode_num(num, charset=None):
         """Encode a number in the given base/charset."""
         if charset is None:
@@ -71,35 +101,67 @@ class EventStamp:
         base = len(charset)
         if num < base:
             return charset[num]
-        else:
-            return EventStamp.encode_num(num // base, charset) + charset[num % base]
+        digits = []
+        while num:
+            num, remainder = divmod(num, base)
+            digits.append(charset[remainder])
+        return ''.join(reversed(digits))
     
+    @staticmethod
     def decode_num(encoded_str, charset=None):
         """Decode a base-encoded string back to an integer."""
-        if charset is None:
-            charset = EventStamp.CHARSET
-        base = len(charset)
-        char_to_value = {c: i for i, c in enumerate(charset)}
-        return reduce(lambda num, c: num * base + char_to_value[c], encoded_str, 0)
+        if charset is None or charset == EventStamp.CHARSET:
+            char_to_value = _CHAR_TO_VAL
+        else:
+            char_to_value = {c: i for i, c in enumerate(charset)}
+        base = len(char_to_value)
+        num = 0
+        for c in encoded_str:
+            num = num * base + char_to_value[c]
+        return num
     
+    @staticmethod
     def encode_time(unix_time=0):
         """Encode current or given unix time."""
         if unix_time == 0:
-            t = int(time.time() * 10000)
+            t = time.time_ns() // 100000  # 0.1 ms ticks, no float round-trip
         else:
             t = int(unix_time * 10000)
         return EventStamp.encode_num(t)
     
+    @staticmethod
+    def next_tick(count=1):
+        """
+        Return the current 0.1 ms tick, bumped past the last one issued.
+        
+        Ticks are strictly increasing within the process, so stamps sort in
+        creation order. Under a burst of more than 10,000 stamps per second
+        the ticks run slightly ahead of the wall clock until it catches up.
+        
+        With count > 1, reserves that many consecutive ticks and returns the
+        first; no other caller is handed any of them.
+        """
+        global _last_tick
+        t = time.time_ns() // 100000
+        with _tick_lock:
+            if t <= _last_tick:
+                t = _last_tick + 1
+            _last_tick = t + count - 1
+        return t
+    
+    @staticmethod
     def encode_doc(doc={}):
         """Encode a document/value to a 5-character hash."""
         return EventStamp.hashify(str(doc), 5)
     
+    @staticmethod
     def encode_rando(length=3):
         """Generate a random code of specified length."""
-        n = randint(300000, 900000)
+        n = _rng.randrange(300000, 900001)
         c = '000' + EventStamp.encode_num(n)
         return c[-length:]
     
+    @staticmethod
     def stamp(doc={}):
         """
         Generate an event stamp.
@@ -107,15 +169,41 @@ class EventStamp:
         Combines encoded time, document hash, and random component
         into a 16-character identifier.
         """
-        time_code = EventStamp.encode_time()
+        doc_str = str(doc)  # Rendered once; large docs make str() costly
+        time_code = EventStamp.encode_num(EventStamp.next_tick())
         rando_code = EventStamp.encode_rando()
-        if len(str(doc)) > 2:
-            doc_code = EventStamp.encode_doc(doc)
-        else:
-            arb = time_code + rando_code
-            doc_code = EventStamp.encode_doc(arb)
+        if len(doc_str) <= 2:
+            doc_str = time_code + rando_code
+        doc_code = EventStamp.hashify(doc_str, 5)
         return (time_code + doc_code + rando_code)[:16]
     
+    @staticmethod
+    def stamp_batch(n):
+        """
+        Generate n unique event stamps in one call.
+        
+        The clock is read and the tick lock taken once for the whole batch,
+        which reserves n consecutive ticks. Each stamp gets its own tick, so
+        the batch is unique (also against concurrent stamp() calls) and
+        sorts in creation order, like stamps made one at a time. As with
+        a burst of stamp() calls, large batches move the tick ahead of the
+        wall clock by n * 0.1 ms until it catches up.
+        """
+        if n <= 0:
+            return []
+        first = EventStamp.next_tick(n)
+        encode_num = EventStamp.encode_num
+        encode_rando = EventStamp.encode_rando
+        encode_doc = EventStamp.encode_doc
+        stamps = []
+        for tick in range(first, first + n):
+            time_code = encode_num(tick)
+            rando_code = encode_rando()
+            doc_code = encode_doc(time_code + rando_code)
+            stamps.append((time_code + doc_code + rando_code)[:16])
+        return stamps
+    
+    @staticmethod
     def decode_time(stamp, charset=None):
         """Decode the time component from an event stamp."""
         if charset is None:
@@ -126,6 +214,19 @@ class EventStamp:
         return unix_time_seconds
 
 
+# Lookup tables for the default Base62 charset, built once at import.
+_CHARSET_B = EventStamp.CHARSET.encode('ascii')
+_CHAR_TO_VAL = {c: i for i, c in enumerate(EventStamp.CHARSET)}
+
+# Short inputs (small docs, names, keys) repeat often and are memoized;
+# long ones rarely repeat and would only pin memory in the cache.
+_HASHIFY_CACHE_MAX_LEN = 256
+
+@lru_cache(maxsize=4096)
+def _hashify_cached(input_string, length):
+    return EventStamp.base62_encode(EventStamp.sha256_hash(input_string), length)
+
+
 # Backwards compatibility aliases
 event_stamp = EventStamp.stamp
 hashify = EventStamp.hashify
@@ -165,6 +266,84 @@ def exchange_key(service, model, request):
     )
     return hashify(canonical)
 
+def json_dumps_bytes(obj):
+    """
+    Serialize obj to UTF-8 JSON bytes for an HTTP request body.
+    
+    Uses orjson when it is installed (it encodes straight to bytes) and
+    stdlib json otherwise. Objects orjson rejects (non-str keys, ints
+    wider than 64 bits) fall back to stdlib json.
+    """
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def json_dumps_document(obj, indent=2):
+    """
+    Serialize obj to UTF-8 JSON bytes for a saved document (e.g. MEMORY.to_json).
+    
+    Non-ASCII text is written as-is (ensure_ascii=False). Uses orjson when it
+    is installed, the indent is one it supports (None or 2) and obj holds only
+    plain JSON values; everything else goes through stdlib json, so output
+    and errors do not depend on whether orjson is installed.
+    """
+    if _orjson is not None and indent in (None, 2) and _is_plain_json(obj):
+        try:
+            return _orjson.dumps(obj, option=_orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            pass
+    return json.dumps(obj, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+def _is_plain_json(obj):
+    """
+    True if obj holds only str, int, float, bool, None, dict, list and tuple
+    values, with no NaN or ±Infinity floats.
+    
+    orjson also encodes datetime, UUID, dataclass and Enum values (as strings
+    that do not round-trip) and writes non-finite floats as null, where stdlib
+    json raises or keeps NaN/Infinity. Anything else takes the stdlib path.
+    """
+    stack = [[obj]]
+    while stack:
+        item = stack.pop()
+        for v in (item.values() if type(item) is dict else item):
+            cls = type(v)
+            if cls is str or cls is int or cls is bool or v is None:
+                continue
+            if cls is dict or cls is list or cls is tuple:
+                stack.append(v)
+            elif cls is not float or v != v or v in (_INF, -_INF):
+                return False
+    return True
+
+
+_INF = float("inf")
+
+
+def json_loads_bytes(raw):
+    """
+    Parse a UTF-8 JSON HTTP response body given as bytes.
+    
+    Uses orjson when it is installed (it parses UTF-8 bytes directly, with
+    no intermediate str) and stdlib json otherwise, which also accepts bytes.
+    Documents orjson rejects (NaN/Infinity literals, oversized ints) fall
+    back to stdlib json.
+    
+    Raises:
+        ValueError: If raw is not valid JSON / UTF-8.
+    """
+    if _orjson is not None:
+        try:
+            return _orjson.loads(raw)
+        except _orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
 #############################################################################
 #############################################################################
 
@@ -185,7 +364,7 @@ def construct_prompt(
     ):
     if order: sections = list(order) 
     else: sections = [a for a in prompt_obj]
-    rnum = str(randint(1,9))
+    rnum = str(_rng.randrange(1,10))
     stamp = event_stamp()[-4:].lower() 
     stamp = stamp[:2]+rnum+stamp[2:]
     L = []
@@ -194,17 +373,19 @@ def construct_prompt(
             L.append(default_header+'\n')
         else: 
             L.append(header+'\n\n')  
-    L.append('<start prompt stamp>\n\n') 
+    # Labels carry the final stamp directly, so no post-join replace pass
+    L.append(f'<start prompt {stamp}>\n\n') 
     for s in sections:
         text = prompt_obj[s]
-        s2 = s.strip().replace(' ','_')  
-        label1 = "<start "+s2+" stamp>\n"
-        label2 = "\n</end "+s2+" stamp>\n\n"
-        block = label1 + text + label2
-        L.append(block) 
-    L.append('</end prompt stamp>')
-    prompt = ''.join(L).replace(' stamp>',' '+stamp+'>')  
-    return prompt 
+        s2 = _section_label(s)  
+        L.append(f"<start {s2} {stamp}>\n{text}\n</end {s2} {stamp}>\n\n") 
+    L.append(f'</end prompt {stamp}>')
+    return ''.join(L) 
+
+@lru_cache(maxsize=1024)
+def _section_label(name):
+    """Normalize a prompt section name for its marker (interned, cached)."""
+    return sys.intern(name.strip().replace(' ','_'))
 
 def construct_msgs(
     usr_prompt = '',
@@ -212,6 +393,18 @@ def construct_msgs(
     sys_prompt = '',
     msgs       = [],
     ):
+    """
+    Build an LLM message list: optional system prompt first, then msgs,
+    then the user prompt, with vars substituted into every message.
+    
+    Each vars key is replaced literally (e.g. '{name}') by str(value) in a
+    single pass over each message: substituted values are not scanned again,
+    so a value containing another key is left as-is; where keys overlap,
+    the longest match wins; empty-string keys are ignored.
+    
+    Raises:
+        TypeError: If a vars key is not a string.
+    """
     if sys_prompt:
         if type(sys_prompt)==dict:
             sys_prompt = construct_prompt(sys_prompt) 
@@ -231,14 +424,33 @@ def construct_msgs(
     #    msgs2.append(m_copy) 
     #return msgs2
     msgs2 = []
+    if vars:
+        pattern = _vars_pattern(tuple(vars))
+        values = {k: str(v) for k, v in vars.items()}
+        repl = lambda match: values[match.group(0)]
     for m in msgs:
         m_copy = dict(m)
-        if isinstance(m_copy.get("content"), str):
-            for k, v in vars.items():
-                m_copy["content"] = m_copy["content"].replace(k, str(v))
+        if vars and isinstance(m_copy.get("content"), str):
+            m_copy["content"] = pattern.sub(repl, m_copy["content"])
         msgs2.append(m_copy)
     return msgs2
 
+@lru_cache(maxsize=256)
+def _vars_pattern(keys):
+    """
+    Compile one alternation regex for a set of placeholder keys.
+
+    Longer keys are tried first so a key that is a prefix of another
+    (e.g. '{name}' and '{name_full}') never shadows it.
+    """
+    for k in keys:
+        if not isinstance(k, str):
+            raise TypeError("construct_msgs vars keys must be str, got {!r}".format(k))
+    keys = sorted((k for k in keys if k), key=len, reverse=True)
+    if not keys:
+        return re.compile(r"(?!)")  # Matches nothing
+    return re.compile("|".join(re.escape(k) for k in keys))
+
 
 
 #############################################################################
@@ -304,8 +516,16 @@ def valid_extract(raw_text: str, parsing_rules: Mapping[str, Any]) -> Any:
     # 1) Collect candidate text segments in a robust order.
     candidates: Iterable[str] = _candidate_segments(raw_text, schema, prefer_fences_first=True)
 
+    # Candidates are generated lazily, so the balanced-slice scan only runs
+    # when no fenced block validates. Identical candidates (e.g. a slice that
+    # spans the whole reply) are parsed once.
     last_err: Optional[Exception] = None
+    tried = set()
     for segment in candidates:
+        key = segment.strip()
+        if key in tried:
+            continue
+        tried.add(key)
         try:
             obj = _parse_segment(segment, kind=kind)
         except Exception as e:
@@ -341,8 +561,9 @@ def _candidate_segments(raw_text: str, schema: Any, prefer_fences_first: bool =
       2) Balanced slice for the top-level delimiter suggested by the schema.
       3) As a fallback, return raw_text itself (last resort).
     """
-    # 1) From code fences
-    if prefer_fences_first:
+    # 1) From code fences (a plain substring check skips the regex when
+    #    the reply has no fences at all, which is the common case)
+    if prefer_fences_first and "```" in raw_text:
         for m in _FENCE_RE.finditer(raw_text):
             body = m.group("body")
             # If the fence declares "python" or "json", prioritize; otherwise still try.
@@ -402,11 +623,27 @@ def _delims_for_schema(schema: Any) -> Tuple[Optional[str], Optional[str]]:
     return None, None
 
 
+_BALANCE_TOKEN_RES = {}
+
+def _balance_token_re(open_ch: str, close_ch: str) -> "re.Pattern[str]":
+    """Return (and cache) a regex matching the only chars the scanner reacts to."""
+    key = (open_ch, close_ch)
+    pat = _BALANCE_TOKEN_RES.get(key)
+    if pat is None:
+        pat = re.compile("[" + re.escape("\\'\"" + open_ch + close_ch) + "]")
+        _BALANCE_TOKEN_RES[key] = pat
+    return pat
+
+
 def _balanced_slice(text: str, open_ch: str, close_ch: str) -> Optional[str]:
     """
     Return the first balanced substring between open_ch and close_ch,
     scanning from the *first occurrence of open_ch* (so prose apostrophes
     before the opener don't confuse quote tracking).
+
+    Only quotes, backslashes and the two delimiters affect the state
+    machine, so the regex engine skips everything else in C and the
+    Python loop runs once per significant character.
     """
     start = text.find(open_ch)
     if start == -1:
@@ -415,14 +652,19 @@ def _balanced_slice(text: str, open_ch: str, close_ch: str) -> Optional[str]:
     depth = 0
     in_str: Optional[str] = None  # quote char if inside ' or "
     escape = False
-    i = start
+    prev = start - 1
 
-    while i < len(text):
+    for m in _balance_token_re(open_ch, close_ch).finditer(text, start):
+        i = m.start()
         ch = text[i]
         if in_str:
             if escape:
                 escape = False
-            elif ch == "\\":
+                if i == prev + 1:
+                    # This char is the one being escaped.
+                    prev = i
+                    continue
+            if ch == "\\":
                 escape = True
             elif ch == in_str:
                 in_str = None
@@ -435,7 +677,7 @@ def _balanced_slice(text: str, open_ch: str, close_ch: str) -> Optional[str]:
                 depth -= 1
                 if depth == 0:
                     return text[start : i + 1]
-        i += 1
+        prev = i
     return None
 
 
@@ -449,106 +691,162 @@ def _is_optional_key(k: str) -> Tuple[str, bool]:
         return k[:-1], True
     return k, False
 
+# Exemplar value type -> validated type ('' -> str, 0 -> int, True -> bool, ...).
+# Keyed on the exact type, so True resolves to bool, never int.
+_EXEMPLAR_TYPES = {
+    str: str,
+    int: int,
+    float: float,
+    bool: bool,
+    type(None): type(None),
+}
+# Type objects accepted directly as schema markers.
+_MARKER_TYPES = frozenset({str, int, float, bool, list, dict, tuple})
+
 def _schema_type(schema: Any) -> Union[type, Tuple[type, ...], None]:
     """
     Map schema exemplars to Python types.
     Accepts either exemplar values ('' -> str, 0 -> int, 0.0 -> float, True -> bool, None -> NoneType)
     OR actual types (str, int, float, bool).
     """
-    if schema is None:
-        return type(None)
-    if schema is str or isinstance(schema, str):
-        return str
-    if schema is int or (isinstance(schema, int) and not isinstance(schema, bool)):
-        return int
-    if schema is float or isinstance(schema, float):
-        return float
-    if schema is bool or isinstance(schema, bool):
-        return bool
-    if schema is list:
-        return list
-    if schema is dict:
-        return dict
-    if schema is tuple:
-        return tuple
+    t = _EXEMPLAR_TYPES.get(type(schema))
+    if t is not None:
+        return t
+    if type(schema) is type:
+        return schema if schema in _MARKER_TYPES else None
+    # Rare: exemplars that are instances of a subclass (e.g. an IntEnum member)
+    for base in (str, bool, int, float):
+        if isinstance(schema, base):
+            return base
     return None  # composite or unknown marker
 
 def _validate_schema(obj: Any, schema: Any, path: str = "$") -> Tuple[bool, str]:
     """
-    Recursively validate 'obj' against 'schema'. Returns (ok, message).
+    Validate 'obj' against 'schema'. Returns (ok, message).
+
+    The schema is compiled once into nested validator closures (see
+    _compile_validator) and cached, so retries with the same parsing
+    rules skip re-interpreting the schema tree.
+    """
+    failure = _get_validator(schema)(obj)
+    if failure is None:
+        return True, "ok"
+    rel_path, reason = failure
+    return False, "{}{}: {}".format(path, rel_path, reason)
+
+
+# Compiled validators keyed by repr(schema): unlike id(), the repr changes
+# when a schema is mutated, so a stale validator can never be served.
+_VALIDATOR_CACHE = {}
+_VALIDATOR_CACHE_MAX = 256
+
+def _get_validator(schema: Any):
+    """Return the cached compiled validator for 'schema', compiling on a miss."""
+    key = repr(schema)
+    validator = _VALIDATOR_CACHE.get(key)
+    if validator is None:
+        if len(_VALIDATOR_CACHE) >= _VALIDATOR_CACHE_MAX:
+            _VALIDATOR_CACHE.clear()
+        validator = _VALIDATOR_CACHE[key] = _compile_validator(schema)
+    return validator
+
+def _compile_validator(schema: Any):
+    """
+    Compile 'schema' into a validator function.
+
+    The returned function takes an object and returns None when it matches,
+    or a (relative_path, reason) tuple describing the first mismatch. Paths
+    are only built on failure, so the success path does no formatting.
     """
     # 1) Primitive types via exemplar or type
     t = _schema_type(schema)
     if t is not None and t not in (list, dict, tuple):
-        if isinstance(obj, t):
-            return True, "ok"
-        return False, "{}: expected {}, got {}".format(path, t.__name__, type(obj).__name__)
-
-    # 2) List schemas
-    if isinstance(schema, list):
-        if not isinstance(obj, list):
-            return False, "{}: expected list, got {}".format(path, type(obj).__name__)
-        # If schema is [], any list passes
+        def validate_primitive(obj):
+            if isinstance(obj, t):
+                return None
+            return "", "expected {}, got {}".format(t.__name__, type(obj).__name__)
+        return validate_primitive
+
+    # 2) List / 4) tuple schemas share the same shape rules
+    if isinstance(schema, (list, tuple)):
+        seq_type = list if isinstance(schema, list) else tuple
+        seq_name = seq_type.__name__
+
+        # [] : any sequence of the right type passes
         if len(schema) == 0:
-            return True, "ok"
-        # If schema is [subschema], every element must match subschema
+            def validate_any_seq(obj):
+                if isinstance(obj, seq_type):
+                    return None
+                return "", "expected {}, got {}".format(seq_name, type(obj).__name__)
+            return validate_any_seq
+
+        # [subschema] : every element must match subschema
         if len(schema) == 1:
-            subschema = schema[0]
-            for i, el in enumerate(obj):
-                ok, msg = _validate_schema(el, subschema, "{}[{}]".format(path, i))
-                if not ok:
-                    return ok, msg
-            return True, "ok"
-        # Otherwise treat as "structure-by-position" (rare)
-        if len(obj) != len(schema):
-            return False, "{}: expected list length {}, got {}".format(path, len(schema), len(obj))
-        for i, (el, subschema) in enumerate(zip(obj, schema)):
-            ok, msg = _validate_schema(el, subschema, "{}[{}]".format(path, i))
-            if not ok:
-                return ok, msg
-        return True, "ok"
+            item_type = _schema_type(schema[0])
+            if item_type is not None and item_type not in (list, dict, tuple):
+                # Primitive items (e.g. [int], ['']) are checked inline, with
+                # no per-element validator call or stack frame.
+                item_name = item_type.__name__
+                def validate_primitive_items(obj):
+                    if not isinstance(obj, seq_type):
+                        return "", "expected {}, got {}".format(seq_name, type(obj).__name__)
+                    for i, el in enumerate(obj):
+                        if not isinstance(el, item_type):
+                            return "[{}]".format(i), "expected {}, got {}".format(item_name, type(el).__name__)
+                    return None
+                return validate_primitive_items
+
+            item_validator = _compile_validator(schema[0])
+            def validate_homogeneous(obj):
+                if not isinstance(obj, seq_type):
+                    return "", "expected {}, got {}".format(seq_name, type(obj).__name__)
+                for i, el in enumerate(obj):
+                    failure = item_validator(el)
+                    if failure is not None:
+                        return "[{}]{}".format(i, failure[0]), failure[1]
+                return None
+            return validate_homogeneous
 
-    # 3) Dict schemas
+        # Otherwise treat as "structure-by-position" (rare)
+        item_validators = [_compile_validator(sub) for sub in schema]
+        expected_len = len(schema)
+        def validate_positional(obj):
+            if not isinstance(obj, seq_type):
+                return "", "expected {}, got {}".format(seq_name, type(obj).__name__)
+            if len(obj) != expected_len:
+                return "", "expected {} length {}, got {}".format(seq_name, expected_len, len(obj))
+            for i, (el, validator) in enumerate(zip(obj, item_validators)):
+                failure = validator(el)
+                if failure is not None:
+                    return "[{}]{}".format(i, failure[0]), failure[1]
+            return None
+        return validate_positional
+
+    # 3) Dict schemas: precompute (key, optional, validator) per schema key
     if isinstance(schema, dict):
-        if not isinstance(obj, dict):
-            return False, "{}: expected dict, got {}".format(path, type(obj).__name__)
-
-        # Check required/optional keys in schema
+        fields = []
         for skey, subschema in schema.items():
             base_key, optional = _is_optional_key(skey)
-            if base_key not in obj:
-                if optional:
-                    continue
-                return False, "{}: missing required key '{}'".format(path, base_key)
-            ok, msg = _validate_schema(obj[base_key], subschema, "{}.{}".format(path, base_key))
-            if not ok:
-                return ok, msg
-        return True, "ok"
-
-    # 4) Tuple schemas (optional)
-    if isinstance(schema, tuple):
-        if not isinstance(obj, tuple):
-            return False, "{}: expected tuple, got {}".format(path, type(obj).__name__)
-        if len(schema) == 0:
-            return True, "ok"
-        if len(schema) == 1:
-            subschema = schema[0]
-            for i, el in enumerate(obj):
-                ok, msg = _validate_schema(el, subschema, "{}[{}]".format(path, i))
-                if not ok:
-                    return ok, msg
-            return True, "ok"
-        if len(obj) != len(schema):
-            return False, "{}: expected tuple length {}, got {}".format(path, len(schema), len(obj))
-        for i, (el, subschema) in enumerate(zip(obj, schema)):
-            ok, msg = _validate_schema(el, subschema, "{}[{}]".format(path, i))
-            if not ok:
-                return ok, msg
-        return True, "ok"
+            fields.append((base_key, optional, _compile_validator(subschema)))
+        def validate_dict(obj):
+            if not isinstance(obj, dict):
+                return "", "expected dict, got {}".format(type(obj).__name__)
+            for base_key, optional, validator in fields:
+                if base_key not in obj:
+                    if optional:
+                        continue
+                    return "", "missing required key '{}'".format(base_key)
+                failure = validator(obj[base_key])
+                if failure is not None:
+                    return ".{}{}".format(base_key, failure[0]), failure[1]
+            return None
+        return validate_dict
 
     # 5) If schema is a type object (e.g., list, dict) we handled above; unknown markers:
     st = type(schema).__name__
-    return False, "{}: unsupported schema marker of type {!r}".format(path, st)
+    def validate_unsupported(obj):
+        return "", "unsupported schema marker of type {!r}".format(st)
+    return validate_unsupported
 
 
 ParsingExamples = """
@@ -626,62 +924,130 @@ VAR_DELETED = _VarDeleted()
 import zlib
 import base64
 
-def compress_to_json(data, content_type='auto'):
+try:
+    import zstandard as _zstd  # Optional codec: pip install thoughtflow[zstd]
+except ImportError:
+    _zstd = None
+
+# Codecs understood by compress_to_json / decompress_from_json. Blobs without
+# a 'codec' key predate the tag and are zlib.
+COMPRESSION_CODECS = ('zlib', 'zstd')
+DEFAULT_COMPRESSION_CODEC = 'zlib'
+
+
+def _require_zstd():
+    if _zstd is None:
+        raise ImportError(
+            "codec='zstd' requires the zstandard package. "
+            "Install it with: pip install thoughtflow[zstd]"
+        )
+    return _zstd
+
+# Default zlib level for stored objects. Level 9 costs several times the CPU
+# of level 6 for a ratio gain of a few percent on typical text/JSON.
+DEFAULT_COMPRESSION_LEVEL = 6
+
+def encode_value(data, content_type='auto'):
     """
-    Compress data to a JSON-serializable dict.
+    Serialize a value to the raw bytes that compress_to_json compresses.
+    
+    len() of the result equals estimate_size(data) for 'auto', so callers
+    can measure and compress a value with a single encode.
     
     Args:
         data: bytes, str, or JSON-serializable object
         content_type: 'bytes', 'text', 'json', 'pickle', or 'auto'
     
     Returns:
-        dict with 'data' (base64 string), sizes, and content_type
+        tuple: (raw_bytes, content_type) with 'auto' resolved
     """
-    # Convert to bytes based on type
     if content_type == 'auto':
         if isinstance(data, bytes):
-            content_type = 'bytes'
-            raw_bytes = data
+            return data, 'bytes'
         elif isinstance(data, str):
-            content_type = 'text'
-            raw_bytes = data.encode('utf-8')
+            return data.encode('utf-8'), 'text'
         else:
             # Try JSON first, fall back to pickle
             try:
-                content_type = 'json'
-                raw_bytes = json.dumps(data).encode('utf-8')
+                return json.dumps(data).encode('utf-8'), 'json'
             except (TypeError, ValueError):
-                content_type = 'pickle'
-                raw_bytes = pickle.dumps(data)
+                return pickle.dumps(data), 'pickle'
     elif content_type == 'bytes':
-        raw_bytes = data
+        return data, content_type
     elif content_type == 'text':
-        raw_bytes = data.encode('utf-8')
+        return data.encode('utf-8'), content_type
     elif content_type == 'json':
-        raw_bytes = json.dumps(data).encode('utf-8')
+        return json.dumps(data).encode('utf-8'), content_type
     elif content_type == 'pickle':
-        raw_bytes = pickle.dumps(data)
+        return pickle.dumps(data), content_type
     else:
         raise ValueError("Unknown content_type: {}".format(content_type))
+
+
+def compress_encoded(raw_bytes, content_type, level=DEFAULT_COMPRESSION_LEVEL, binary=False,
+                     codec=DEFAULT_COMPRESSION_CODEC):
+    """
+    Compress bytes from encode_value into the compress_to_json dict format.
+    
+    Args:
+        raw_bytes: Serialized value
+        content_type: The content_type returned by encode_value
+        level, binary, codec: As for compress_to_json
     
-    # Compress and base64 encode
-    compressed = zlib.compress(raw_bytes, level=9)
-    encoded = base64.b64encode(compressed).decode('ascii')
+    Returns:
+        dict with 'data', sizes, content_type and codec
+    """
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError("Unknown codec: {}".format(codec))
+    
+    # Compress and (unless binary) base64 encode
+    if codec == 'zstd':
+        compressed = _require_zstd().ZstdCompressor(level=level).compress(raw_bytes)
+    else:
+        compressed = zlib.compress(raw_bytes, level=level)
+    encoded = compressed if binary else base64.b64encode(compressed).decode('ascii')
     
     return {
         'data': encoded,
         'size_original': len(raw_bytes),
         'size_compressed': len(compressed),
         'content_type': content_type,
+        'codec': codec,
     }
 
 
+def compress_to_json(data, content_type='auto', level=DEFAULT_COMPRESSION_LEVEL, binary=False,
+                     codec=DEFAULT_COMPRESSION_CODEC):
+    """
+    Compress data to a JSON-serializable dict.
+    
+    Args:
+        data: bytes, str, or JSON-serializable object
+        content_type: 'bytes', 'text', 'json', 'pickle', or 'auto'
+        level: Compression level (default 6): 0-9 for zlib, 1-22 for zstd.
+            Any level decompresses with decompress_from_json.
+        binary: If True, 'data' holds the raw compressed bytes instead of a
+            base64 string. Skips the base64 round-trip (and its 33% size
+            overhead) for binary containers such as pickle; the result is
+            then no longer JSON-serializable.
+        codec: 'zlib' (default, stdlib) or 'zstd' (faster, needs the
+            zstandard package to write and to read back).
+    
+    Returns:
+        dict with 'data' (base64 string, or bytes if binary), sizes,
+        content_type and codec
+    """
+    raw_bytes, content_type = encode_value(data, content_type)
+    return compress_encoded(raw_bytes, content_type, level=level, binary=binary, codec=codec)
+
+
 def decompress_from_json(obj_dict):
     """
     Decompress data from JSON-serializable dict.
     
     Args:
-        obj_dict: dict from compress_to_json
+        obj_dict: dict from compress_to_json ('data' may be a base64
+            string or raw bytes from binary=True; a missing 'codec' means zlib)
     
     Returns:
         Original data in its original type
@@ -690,8 +1056,17 @@ def decompress_from_json(obj_dict):
     content_type = obj_dict['content_type']
     
     # Decode and decompress
-    compressed = base64.b64decode(encoded)
-    raw_bytes = zlib.decompress(compressed)
+    if isinstance(encoded, (bytes, bytearray)):
+        compressed = encoded
+    else:
+        compressed = base64.b64decode(encoded)
+    codec = obj_dict.get('codec', 'zlib')
+    if codec == 'zlib':
+        raw_bytes = zlib.decompress(compressed)
+    elif codec == 'zstd':
+        raw_bytes = _require_zstd().ZstdDecompressor().decompress(compressed)
+    else:
+        raise ValueError("Unknown codec: {}".format(codec))
     
     # Convert back to original type
     if content_type == 'bytes':
@@ -706,10 +1081,87 @@ def decompress_from_json(obj_dict):
         raise ValueError("Unknown content_type: {}".format(content_type))
 
 
+def iter_decompressed(obj_dict, chunk_size=65536):
+    """
+    Decompress an object incrementally, yielding raw byte chunks.
+    
+    Base64 decoding and decompression both proceed chunk by chunk, so a
+    consumer that stops early never pays for (or holds) the whole payload.
+    
+    Args:
+        obj_dict: dict from compress_to_json
+        chunk_size: Approximate size of each compressed/decompressed step
+    
+    Yields:
+        bytes: Consecutive pieces of the original serialized value
+    """
+    encoded = obj_dict['data']
+    codec = obj_dict.get('codec', 'zlib')
+    if codec == 'zlib':
+        dobj = zlib.decompressobj()
+    elif codec == 'zstd':
+        dobj = _require_zstd().ZstdDecompressor().decompressobj()
+    else:
+        raise ValueError("Unknown codec: {}".format(codec))
+    
+    step = chunk_size - chunk_size % 4 or 4  # base64 decodes in 4-char groups
+    for i in range(0, len(encoded), step):
+        piece = encoded[i:i + step]
+        if not isinstance(piece, (bytes, bytearray)):
+            piece = base64.b64decode(piece)
+        if codec == 'zlib':
+            # Bound each output so highly compressible data stays chunked
+            out = dobj.decompress(piece, chunk_size)
+            while out:
+                yield out
+                out = dobj.decompress(dobj.unconsumed_tail, chunk_size)
+        else:
+            out = dobj.decompress(piece)
+            if out:
+                yield out
+    if codec == 'zlib':
+        out = dobj.flush()
+        if out:
+            yield out
+
+
+def decompress_head_tail(obj_dict, head_bytes, tail_bytes):
+    """
+    Return the first head_bytes and last tail_bytes of an object's raw bytes.
+    
+    Decompression stops as soon as the head is available when no tail is
+    requested; otherwise the stream is read through while only a bounded
+    tail window is kept, never the full decompressed buffer.
+    
+    Args:
+        obj_dict: dict from compress_to_json
+        head_bytes: Number of leading bytes wanted
+        tail_bytes: Number of trailing bytes wanted (0 = none)
+    
+    Returns:
+        tuple: (head, tail) as bytes
+    """
+    head = bytearray()
+    tail = bytearray()
+    for chunk in iter_decompressed(obj_dict):
+        if len(head) < head_bytes:
+            head += chunk[:head_bytes - len(head)]
+        if tail_bytes:
+            tail += chunk
+            if len(tail) > 2 * tail_bytes:
+                del tail[:-tail_bytes]
+        elif len(head) >= head_bytes:
+            break
+    return bytes(head), bytes(tail[-tail_bytes:]) if tail_bytes else b''
+
+
 def estimate_size(value):
     """
     Estimate the serialized size of a value in bytes.
     
+    ASCII strings are measured without encoding a copy, and JSON output
+    (ensure_ascii, so always ASCII) is measured directly as a str.
+    
     Args:
         value: Any value
         
@@ -719,10 +1171,10 @@ def estimate_size(value):
     if isinstance(value, bytes):
         return len(value)
     elif isinstance(value, str):
-        return len(value.encode('utf-8'))
+        return len(value) if value.isascii() else len(value.encode('utf-8'))
     else:
         try:
-            return len(json.dumps(value).encode('utf-8'))
+            return len(json.dumps(value))
         except (TypeError, ValueError):
             return len(pickle.dumps(value))
 
@@ -769,11 +1221,10 @@ def truncate_content(content, stamp, threshold=500, header_len=200, footer_len=2
     # Calculate how much we're removing
     chars_omitted = len(content) - header_len - footer_len
     
-    # Build the truncation marker
-    marker = "\n\n[...TRUNCATED: {:,} chars omitted. To expand, request stamp: {}...]\n\n".format(chars_omitted, stamp)
-    
-    # Extract header and footer
-    header = content[:header_len]
-    footer = content[-footer_len:]
-    
-    return header + marker + footer
+    # Header, marker and footer are assembled in a single string build
+    # (no intermediate header+marker concatenation)
+    return (
+        f"{content[:header_len]}"
+        f"\n\n[...TRUNCATED: {chars_omitted:,} chars omitted. To expand, request stamp: {stamp}...]\n\n"
+        f"{content[-footer_len:]}"
+    )
@@ -13,10 +13,26 @@ trace machinery is needed: the memory IS the recording.
 from __future__ import annotations
 
 import json
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import urllib.request
 import urllib.error
 
-from thoughtflow._util import exchange_key, TRANSPORT_PARAM_KEYS
+from thoughtflow._util import exchange_key, json_dumps_bytes, json_loads_bytes, TRANSPORT_PARAM_KEYS
+from thoughtflow._connpool import ConnectionPool, uses_proxy
+
+
+# Header dicts that never change per call; shared, never mutated.
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+_GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{}:generateContent?key={}"
+
+
+# Process-wide keep-alive pool shared by every LLM(keep_alive=True), so
+# connections survive across instances (e.g. one LLM per THOUGHT).
+_SHARED_POOL = ConnectionPool(maxsize=8)
 
 
 class ReplayMissError(KeyError):
@@ -54,7 +70,25 @@ class LLM:
             Initializes the LLM instance. Any additional keyword arguments
             (temperature, max_tokens, top_p, frequency_penalty, presence_penalty,
             etc.) are stored as defaults applied to every call.  Per-call params
-            override these defaults.
+            override these defaults.  Pass keep_alive=True to reuse pooled
+            connections across calls (streamed ones included, e.g. tight
+            local Ollama loops); requests an HTTP(S)_PROXY applies to (and
+            NO_PROXY does not exempt) still go through urllib and the
+            proxy, unpooled.  Pass response_cache=N to memoize up to
+            N deterministic responses.
+        
+        close():
+            Closes pooled keep-alive connections (only used with keep_alive=True).
+        
+        acall(msg_list, params) / acall_many(msg_lists, params):
+            Awaitable call() and concurrent fan-out of independent calls.
+        
+        batch_call(msg_lists, params):
+            Synchronous concurrent fan-out (thread pool), results in order.
+        
+        clear_cache():
+            Drops responses cached via response_cache=N (deterministic
+            requests only: temperature=0 or an explicit seed).
         
         call(msg_list, params):
             Calls the appropriate API based on the service with the given message list and parameters.
@@ -86,6 +120,18 @@ class LLM:
         _send_request(url, data, headers):
             Helper function to send HTTP requests to the specified URL with data and headers.
     """
+    # service -> name of the method that handles non-streaming calls. Looked up
+    # once per call instead of an if/elif ladder; a subclass adds a provider by
+    # defining its _call_<service> method and extending this table.
+    _PROVIDER_METHODS = {
+        'openai':     '_call_openai',
+        'groq':       '_call_groq',
+        'anthropic':  '_call_anthropic',
+        'ollama':     '_call_ollama',
+        'gemini':     '_call_gemini',
+        'openrouter': '_call_openrouter',
+    }
+
     def __init__(self, model_id='', key='API_KEY', secret='API_SECRET', **kwargs):
         # Parse model ID and initialize service and model name
         if ':' not in model_id: model_id = 'openai:gpt-4-turbo'
@@ -97,10 +143,30 @@ class LLM:
         self.api_secret = secret
         self.last_params = {} 
         self.default_params = {}
+        self._headers_cache = (None, {})   # (api_key, kind -> header dict)
 
         # Optional MEMORY that receives a record of every exchange
         self._record_memory = kwargs.pop('record', None)
 
+        # Opt-in keep-alive pool: reuses connections across calls instead of
+        # a fresh TCP/TLS handshake per request (see close()). True shares
+        # the process-wide pool across LLM instances; a ConnectionPool
+        # instance is used as given.
+        keep_alive = kwargs.pop('keep_alive', False)
+        if isinstance(keep_alive, ConnectionPool):
+            self._pool = keep_alive
+        elif keep_alive:
+            self._pool = _SHARED_POOL
+        else:
+            self._pool = None
+
+        # Opt-in LRU of responses to deterministic requests (temperature=0
+        # or an explicit seed). None disables it; see clear_cache().
+        cache_size = kwargs.pop('response_cache', None)
+        self._response_cache = OrderedDict() if cache_size else None
+        self._response_cache_size = cache_size or 0
+        self._response_cache_lock = threading.Lock()
+
         # Recognized constructor-level defaults; anything else is passed
         # through as a provider-specific param (e.g. ollama_url).
         for k, v in kwargs.items():
@@ -110,6 +176,16 @@ class LLM:
         # Make the object directly callable
         self.__call__ = self.call
 
+    def close(self):
+        """
+        Close idle pooled keep-alive connections (no-op without keep_alive).
+
+        With the shared pool this closes idle connections for every
+        keep_alive LLM; they are transparently reopened on the next call.
+        """
+        if self._pool is not None:
+            self._pool.close()
+
     def record(self, memory):
         """
         Start recording every exchange into the given MEMORY.
@@ -209,6 +285,14 @@ class LLM:
         Returns:
             list[{'role': str, 'content': str or list[...]}]
         """
+        # Fast path: messages that are already exactly {'role', 'content'}
+        # dicts (the common case after construct_msgs) need no rebuilding.
+        if all(
+            type(m) is dict and len(m) == 2 and "role" in m and "content" in m
+            for m in msg_list
+        ):
+            return list(msg_list)
+
         norm = []
         for m in msg_list:
             if isinstance(m, dict):
@@ -233,16 +317,20 @@ class LLM:
             msg_list: List of normalised message dicts (from _normalize_messages).
 
         Returns:
-            list[dict]: New message dicts with translated roles.
+            list[dict]: New list; only messages whose role is translated are
+            copied, the rest are shared with the input (never mutated).
         """
         role_map = PROVIDER_ROLE_MAP.get(self.service, {})
         if not role_map:
             return msg_list
         mapped = []
         for m in msg_list:
-            m_copy = dict(m)
-            m_copy["role"] = role_map.get(m["role"], m["role"])
-            mapped.append(m_copy)
+            role = m["role"]
+            new_role = role_map.get(role, role)
+            if new_role != role:
+                m = dict(m)
+                m["role"] = new_role
+            mapped.append(m)
         return mapped
 
     def _prepare_messages(self, msg_list):
@@ -262,6 +350,46 @@ class LLM:
         normalized = self._normalize_messages(msg_list)
         return self._map_roles(normalized)
 
+    def _static_headers(self, kind):
+        """
+        Return the constant header dict for a provider family.
+
+        Built once per api_key and reused across calls (rebuilt if the key
+        is reassigned). Callers must copy before adding per-call headers.
+
+        Args:
+            kind: 'bearer', 'groq', or 'anthropic'.
+        """
+        cached_key, cache = self._headers_cache
+        if cached_key != self.api_key:
+            cache = {}
+            self._headers_cache = (self.api_key, cache)
+        headers = cache.get(kind)
+        if headers is None:
+            if kind == 'anthropic':
+                headers = {
+                    "x-api-key": self.api_key,
+                    "anthropic-version": "2023-06-01",
+                    "Content-Type": "application/json",
+                }
+            else:
+                headers = {
+                    "Authorization": "Bearer " + self.api_key,
+                    "Content-Type": "application/json",
+                }
+                if kind == 'groq':
+                    headers["User-Agent"] = "Groq/Python 0.9.0"
+            cache[kind] = headers
+        return headers
+
+    def _openrouter_headers(self, params):
+        """Bearer headers plus OpenRouter's per-call attribution headers."""
+        return {
+            **self._static_headers('bearer'),
+            "HTTP-Referer": params.get("referer", "https://your-app.com"),
+            "X-Title": params.get("title", "ThoughtFlow"),
+        }
+
     def _resolve_openai_transport(self, params):
         """Pop transport-only keys from params and return (url, headers, is_local).
 
@@ -277,12 +405,9 @@ class LLM:
         else:
             url = "https://api.openai.com/v1/chat/completions"
 
-        headers = {
-            "Authorization": "Bearer " + self.api_key,
-            "Content-Type": "application/json",
-        }
+        headers = self._static_headers('bearer')
         if extra_headers:
-            headers.update(extra_headers)
+            headers = {**headers, **extra_headers}
 
         return url, headers, bool(base_url)
 
@@ -339,29 +464,129 @@ class LLM:
                 return self._record_stream(gen, key, request)
             return gen
 
+        cache_key = None
+        if self._response_cache is not None and self._is_deterministic(merged):
+            cache_key = self._response_cache_key(msg_list, merged, output_schema)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                if recording:
+                    self._record_exchange(key, request, cached)
+                return cached
+
         call_params = dict(merged)
         if output_schema:
             call_params['_output_schema'] = output_schema
 
-        if self.service == 'openai':
-            choices = self._call_openai(msg_list, call_params)
-        elif self.service == 'groq':
-            choices = self._call_groq(msg_list, call_params)
-        elif self.service == 'anthropic':
-            choices = self._call_anthropic(msg_list, call_params)
-        elif self.service == 'ollama':
-            choices = self._call_ollama(msg_list, call_params)
-        elif self.service == 'gemini':
-            choices = self._call_gemini(msg_list, call_params)
-        elif self.service == 'openrouter':
-            choices = self._call_openrouter(msg_list, call_params)
-        else:
+        method = self._PROVIDER_METHODS.get(self.service)
+        if method is None:
             raise ValueError("Unsupported service '{}'.".format(self.service))
+        choices = getattr(self, method)(msg_list, call_params)
 
+        if cache_key is not None and choices:
+            self._cache_put(cache_key, choices)
         if recording:
             self._record_exchange(key, request, choices)
         return choices
 
+    @staticmethod
+    def _is_deterministic(params):
+        """True when repeated identical requests should return the same answer."""
+        return params.get('temperature') == 0 or params.get('seed') is not None
+
+    def _response_cache_key(self, msg_list, params, output_schema):
+        """Content hash of the full request, transport params included."""
+        return exchange_key(self.service, self.model, {
+            'messages': self._normalize_messages(msg_list),
+            'params': params,
+            'output_schema': output_schema,
+        })
+
+    def _cache_get(self, key):
+        with self._response_cache_lock:
+            choices = self._response_cache.get(key)
+            if choices is None:
+                return None
+            self._response_cache.move_to_end(key)
+            return list(choices)
+
+    def _cache_put(self, key, choices):
+        with self._response_cache_lock:
+            self._response_cache[key] = list(choices)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self._response_cache_size:
+                self._response_cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Drop all cached responses (no-op unless response_cache is set)."""
+        if self._response_cache is not None:
+            with self._response_cache_lock:
+                self._response_cache.clear()
+
+    async def acall(self, msg_list, params={}, output_schema=None):
+        """
+        Awaitable version of call() for use inside an asyncio event loop.
+
+        The blocking HTTP round-trip runs in a worker thread, so other
+        coroutines (e.g. independent THOUGHTs) keep running meanwhile.
+        Combine with keep_alive=True to also reuse connections.
+
+        Returns:
+            list[str]: Response strings (one per choice).
+        """
+        return await asyncio.to_thread(self.call, msg_list, params, output_schema)
+
+    async def acall_many(self, msg_lists, params={}, output_schema=None, max_concurrency=8):
+        """
+        Run several independent calls concurrently and return their results.
+
+        Args:
+            msg_lists (list): One message list per request.
+            params (dict): Parameters applied to every request.
+            output_schema (dict, optional): Structured output schema for every request.
+            max_concurrency (int): Upper bound on requests in flight at once.
+
+        Returns:
+            list[list[str]]: Choices per request, in the same order as msg_lists.
+
+        Note:
+            last_params reflects whichever request finished last.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(msg_list):
+            async with semaphore:
+                return await self.acall(msg_list, params, output_schema)
+
+        return await asyncio.gather(*(_one(m) for m in msg_lists))
+
+    def batch_call(self, msg_lists, params={}, output_schema=None, max_workers=8):
+        """
+        Synchronous fan-out: send independent requests concurrently.
+
+        Same semantics as acall_many(), but callable from plain (non-async)
+        code, including environments that already run an event loop such
+        as Jupyter. Wall-clock time is roughly the slowest single request
+        rather than the sum of all of them.
+
+        Args:
+            msg_lists (list): One message list per request.
+            params (dict): Parameters applied to every request.
+            output_schema (dict, optional): Structured output schema for every request.
+            max_workers (int): Upper bound on requests in flight at once.
+
+        Returns:
+            list[list[str]]: Choices per request, in the same order as msg_lists.
+        """
+        if not msg_lists:
+            return []
+        workers = max(1, min(max_workers, len(msg_lists)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.call, m, params, output_schema)
+                for m in msg_lists
+            ]
+            return [f.result() for f in futures]
+
     def _call_openai(self, msg_list, params):
         url, headers, is_local = self._resolve_openai_transport(params)
         output_schema = params.pop('_output_schema', None)
@@ -385,7 +610,7 @@ class LLM:
                 },
             }
 
-        data = json.dumps(payload).encode("utf-8")
+        data = json_dumps_bytes(payload)
         res = self._send_request(url, data, headers)
         choices = [a["message"]["content"] for a in res.get("choices", [])]
         return choices
@@ -409,12 +634,8 @@ class LLM:
                 },
             }
 
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "Authorization": "Bearer " + self.api_key,
-            "Content-Type": "application/json",
-            "User-Agent": "Groq/Python 0.9.0",
-        }
+        data = json_dumps_bytes(payload)
+        headers = self._static_headers('groq')
         res = self._send_request(url, data, headers)
         choices = [a["message"]["content"] for a in res.get("choices", [])]
         return choices
@@ -463,12 +684,8 @@ class LLM:
             }]
             payload["tool_choice"] = {"type": "tool", "name": schema_name}
 
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01",
-            "Content-Type": "application/json",
-        }
+        data = json_dumps_bytes(payload)
+        headers = self._static_headers('anthropic')
         res = self._send_request(url, data, headers)
 
         # When structured output is used, the response is in tool_use blocks
@@ -502,7 +719,7 @@ class LLM:
         """
         call_params = dict(params)
         call_params.pop('_output_schema', None)
-        url = "https://generativelanguage.googleapis.com/v1beta/models/{}:generateContent?key={}".format(self.model, self.api_key)
+        url = _GEMINI_URL.format(self.model, self.api_key)
         # Gemini expects [{"role": "user"/"model", "parts": [{"text": ...}]}].
         # Role translation (assistant→model, system→user, etc.) is handled by
         # _prepare_messages() via PROVIDER_ROLE_MAP — no inline mapping needed.
@@ -516,10 +733,8 @@ class LLM:
         payload = {"contents": gemini_msgs}
         if generation_config:
             payload["generationConfig"] = generation_config
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "Content-Type": "application/json",
-        }
+        data = json_dumps_bytes(payload)
+        headers = _JSON_HEADERS
         res = self._send_request(url, data, headers)
         # Gemini returns { "candidates": [ { "content": { "parts": [ { "text": ... } ] } } ] }
         choices = []
@@ -551,13 +766,8 @@ class LLM:
                     "schema": output_schema,
                 },
             }
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "Authorization": "Bearer " + self.api_key,
-            "Content-Type": "application/json",
-            "HTTP-Referer": params.get("referer", "https://your-app.com"),
-            "X-Title": params.get("title", "ThoughtFlow"),
-        }
+        data = json_dumps_bytes(payload)
+        headers = self._openrouter_headers(params)
         res = self._send_request(url, data, headers)
         choices = [a["message"]["content"] for a in res.get("choices", [])]
         return choices
@@ -579,10 +789,8 @@ class LLM:
         # Ollama supports structured output via the 'format' key
         if output_schema:
             payload["format"] = output_schema
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "Content-Type": "application/json",
-        }
+        data = json_dumps_bytes(payload)
+        headers = _JSON_HEADERS
         res = self._send_request(url, data, headers)
 
         def _message_to_choice(message: dict) -> str:
@@ -659,23 +867,14 @@ class LLM:
             url, headers, is_local = self._resolve_openai_transport(params)
         elif self.service == 'groq':
             url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {
-                "Authorization": "Bearer " + self.api_key,
-                "Content-Type": "application/json",
-                "User-Agent": "Groq/Python 0.9.0",
-            }
+            headers = self._static_headers('groq')
         elif self.service == 'openrouter':
             url = "https://openrouter.ai/api/v1/chat/completions"
-            headers = {
-                "Authorization": "Bearer " + self.api_key,
-                "Content-Type": "application/json",
-                "HTTP-Referer": params.get("referer", "https://your-app.com"),
-                "X-Title": params.get("title", "ThoughtFlow"),
-            }
+            headers = self._openrouter_headers(params)
         elif self.service == 'ollama':
             base_url = params.get("ollama_url", "http://localhost:11434")
             url = base_url.rstrip('/') + "/api/chat"
-            headers = {"Content-Type": "application/json"}
+            headers = _JSON_HEADERS
         else:
             raise ValueError("Streaming not supported for service '{}'.".format(self.service))
 
@@ -711,15 +910,24 @@ class LLM:
                     },
                 }
 
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(url, data=data, headers=headers)
+        data = json_dumps_bytes(payload)
+        pooled = self._pool is not None and not uses_proxy(url)
 
         try:
-            response = urllib.request.urlopen(req)
+            if pooled:
+                # Keep-alive: the connection is reused once the stream ends
+                response = self._pool.stream("POST", url, body=data, headers=headers)
+                if response.status >= 400:
+                    response.close()
+                    return
+            else:
+                req = urllib.request.Request(url, data=data, headers=headers)
+                response = urllib.request.urlopen(req)
         except Exception:
             return
 
         # Parse the SSE / NDJSON stream
+        finished = False
         try:
             if self.service == 'ollama':
                 # Ollama uses newline-delimited JSON
@@ -734,6 +942,7 @@ class LLM:
                     if content:
                         yield content
                     if chunk.get("done"):
+                        finished = True
                         break
             else:
                 # OpenAI-compatible SSE format
@@ -743,6 +952,7 @@ class LLM:
                     if line.startswith("data: "):
                         line = line[6:]
                     if line.strip() == "[DONE]":
+                        finished = True
                         break
                     try:
                         chunk = json.loads(line)
@@ -753,6 +963,13 @@ class LLM:
                     if content:
                         yield content
         finally:
+            if pooled and finished:
+                # The server ends the body right after the done marker; read
+                # the terminator so the connection can go back to the pool.
+                try:
+                    response.read()
+                except Exception:
+                    pass
             response.close()
 
     def _iter_lines(self, response):
@@ -760,7 +977,10 @@ class LLM:
         Yield lines from an HTTP response, handling buffered reads.
 
         Reads the response in small chunks and yields complete lines. This
-        avoids loading the entire stream into memory at once.
+        avoids loading the entire stream into memory at once. Lines are
+        split on raw bytes and decoded only once complete, so a multi-byte
+        UTF-8 character straddling two reads is never mangled, and each
+        chunk is scanned once instead of re-splitting the buffer per line.
 
         Args:
             response: An open urllib response object.
@@ -768,39 +988,77 @@ class LLM:
         Yields:
             str: Individual lines from the response.
         """
-        buf = ""
+        buf = b""
         while True:
             chunk = response.read(4096)
             if not chunk:
                 if buf:
-                    yield buf
+                    yield buf.decode("utf-8", errors="replace")
                 break
-            buf += chunk.decode("utf-8", errors="replace")
-            while "\n" in buf:
-                line, buf = buf.split("\n", 1)
-                yield line.strip()
+            buf += chunk
+            start = 0
+            while True:
+                end = buf.find(b"\n", start)
+                if end == -1:
+                    break
+                yield buf[start:end].decode("utf-8", errors="replace").strip()
+                start = end + 1
+            buf = buf[start:]
 
     def _send_request(self, url, data, headers):
         """Send an HTTP POST request and return the parsed JSON response."""
+        if self._pool is not None and not uses_proxy(url):
+            return self._send_pooled_request(url, data, headers)
         try:
             req = urllib.request.Request(url, data=data, headers=headers)
             with urllib.request.urlopen(req) as response:
-                response_data = response.read().decode("utf-8")  
-                # Attempt to parse JSON response; handle plain-text responses
-                try:
-                    return json.loads(response_data)  # Parse JSON response
-                except json.JSONDecodeError:
-                    # If response is not JSON, return it as-is in a structured format
-                    return {"error": "Non-JSON response", "response_data": response_data}
+                return self._parse_response(response.read())
                 
         except urllib.error.HTTPError as e:
             # Return the error details in case of an HTTP error
-            error_msg = e.read().decode("utf-8")
-            print("HTTP Error:", error_msg)  # Log HTTP error for debugging
-            return {"error": json.loads(error_msg) if error_msg else "Unknown HTTP error"}
+            return self._parse_error(e.read())
         except Exception as e:
             return {"error": str(e)}  
 
+    def _send_pooled_request(self, url, data, headers):
+        """Like _send_request, but over a reused keep-alive connection."""
+        try:
+            status, raw = self._pool.request("POST", url, body=data, headers=headers)
+            if status >= 400:
+                return self._parse_error(raw)
+            return self._parse_response(raw)
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _parse_error(raw):
+        """
+        Wrap an HTTP error body in an error dict.
+
+        Shared by the urllib and pooled paths so both report errors alike:
+        a JSON body is parsed, anything else is kept as text.
+        """
+        text = raw.decode("utf-8", errors="replace")
+        print("HTTP Error:", text)  # Log HTTP error for debugging
+        try:
+            return {"error": json_loads_bytes(raw)}
+        except ValueError:
+            return {"error": text or "Unknown HTTP error"}
+
+    @staticmethod
+    def _parse_response(raw):
+        """
+        Parse a JSON response body; wrap non-JSON bodies in an error dict.
+
+        The body is parsed straight from bytes (see json_loads_bytes), so it
+        is only decoded to str when it turns out not to be JSON.
+        """
+        try:
+            return json_loads_bytes(raw)  # Parse JSON response
+        except ValueError:
+            # If response is not JSON, return it as-is in a structured format
+            return {"error": "Non-JSON response", "response_data": raw.decode("utf-8", errors="replace")}
+
 
 class ReplayLLM(LLM):
     """
@@ -25,49 +25,198 @@ Example:
 
 from __future__ import annotations
 
+import os
+import sys
+import gzip
 import json
+import math
+import time
 import copy
-import bisect
 import pickle
 import pprint
 import datetime as dtt
+from bisect import insort
+from collections import defaultdict, deque
+from itertools import islice
 
 from thoughtflow._util import (
     event_stamp,
     VAR_DELETED,
     compress_to_json,
+    compress_encoded,
+    encode_value,
     decompress_from_json,
-    estimate_size,
+    decompress_head_tail,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_COMPRESSION_CODEC,
     is_obj_ref,
+    _require_zstd,
+    json_dumps_document,
     truncate_content,
     tz_bog,
     tz_utc,
 )
 
 
+# Value types whose repr() is short and matches str(); set_var sizes them
+# without serializing.
+_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+# Frame header that starts every zstandard stream; load() uses it to tell
+# zstd saves from gzip ones.
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# gzip level for save(compressed=True). Stored objects are already
+# zlib-compressed, so gzip's default level 9 burns CPU for almost no extra
+# ratio. Kept apart from DEFAULT_COMPRESSION_LEVEL (per-object zlib) so
+# tuning one does not change the other.
+_SAVE_GZIP_LEVEL = 6
+
+# (unix second, 'YYYY-MM-DD HH:MM:SS' in Bogota, same in UTC). Swapped as a
+# single tuple, so concurrent writers always see a consistent entry.
+_second_prefixes = (None, '', '')
+
+
+def _now_strings():
+    """
+    Return the current time as (dt_bog, dt_utc) strings, e.g. '2025-01-31 14:05:09.123'.
+    
+    Reads the clock once, so both fields describe the same instant. The
+    date-time prefixes are formatted (with full zoneinfo conversion) only
+    once per wall-clock second; each event just appends its milliseconds.
+    """
+    global _second_prefixes
+    sec, ns = divmod(time.time_ns(), 1_000_000_000)
+    cached_sec, prefix_bog, prefix_utc = _second_prefixes
+    if sec != cached_sec:
+        now_utc = dtt.datetime.fromtimestamp(sec, tz_utc)
+        prefix_bog = now_utc.astimezone(tz_bog).strftime('%Y-%m-%d %H:%M:%S')
+        prefix_utc = now_utc.strftime('%Y-%m-%d %H:%M:%S')
+        _second_prefixes = (sec, prefix_bog, prefix_utc)
+    millis = '.%03d' % (ns // 1_000_000)
+    return prefix_bog + millis, prefix_utc + millis
+
+
+# Event prototypes: add_msg/add_log/add_ref/set_var copy one and fill the varying
+# fields, which is cheaper than building the dict literal on every event.
+# Key order matches the literals they replace, so serialized events are unchanged.
+_MSG_PROTO = {
+    'stamp'   : None,
+    'type'    : 'msg',
+    'role'    : None,
+    'content' : None,
+    'mode'    : 'text',
+    'channel' : 'unknown',
+    'dt_bog'  : None,
+    'dt_utc'  : None,
+}
+_LOG_PROTO = {
+    'stamp'   : None,
+    'type'    : 'log',
+    'role'    : 'logger',
+    'content' : None,
+    'mode'    : 'text',
+    'dt_bog'  : None,
+    'dt_utc'  : None,
+}
+_REF_PROTO = {
+    'stamp'   : None,
+    'type'    : 'ref',
+    'role'    : 'reflection',
+    'content' : None,
+    'mode'    : 'text',
+    'dt_bog'  : None,
+    'dt_utc'  : None,
+}
+_VAR_PROTO = {
+    'stamp'    : None,
+    'type'     : 'var',
+    'role'     : 'system',
+    'var_name' : None,
+    'var_value': None,
+    'var_desc' : None,
+    'content'  : None,
+    'mode'     : 'text',
+    'dt_bog'   : None,
+    'dt_utc'   : None,
+}
+
+# Low-cardinality event fields. Events decoded from JSON or handed to
+# from_events carry their own copy of each of these strings; interning them
+# makes every event share one object per distinct value.
+_INTERNED_FIELDS = ('type', 'role', 'mode', 'channel')
+
+
+def _intern_event(ev):
+    """Intern the low-cardinality string fields of an event dict in place."""
+    for field in _INTERNED_FIELDS:
+        value = ev.get(field)
+        if type(value) is str:
+            ev[field] = sys.intern(value)
+    return ev
+
+
+# render(include=...) names → event types
+_RENDER_TYPES = {'msgs': 'msg', 'logs': 'log', 'refs': 'ref', 'vars': 'var'}
+
+# Marker appended where render() snips output at max_length
+_SNIP_NOTICE = " [snipped]"
+
+# Event fields kept by render(format='json', include_metadata=False)
+_JSON_KEEP_KEYS = frozenset(('role', 'content', 'type', 'channel'))
+
+
+def _filter_set(values):
+    """Return a role/mode filter as a frozenset (a bare string is left as is)."""
+    if isinstance(values, (str, frozenset)):
+        return values
+    return frozenset(values)
+
+def _replay_var(mem, ev, stamp):
+    """Apply a 'var' event to mem.vars / mem.var_desc_history (used by from_events)."""
+    var_name = ev.get('var_name')
+    if not var_name:
+        return
+    
+    # Determine value (check for deletion marker)
+    if ev.get('var_deleted', False):
+        value = VAR_DELETED
+    else:
+        value = ev.get('var_value')
+    mem.vars[var_name].append([stamp, value])
+    
+    # Rebuild description history if present, skipping repeats of the last one
+    var_desc = ev.get('var_desc')
+    if var_desc:
+        desc_hist = mem.var_desc_history[var_name]
+        if not desc_hist or desc_hist[-1][1] != var_desc:
+            desc_hist.append([stamp, var_desc])
+
+
 class MEMORY:
     """
     The MEMORY class serves as an event-sourced state container for managing events, 
     logs, messages, reflections, and variables within the ThoughtFlow framework. 
     
     All state changes are stored as events with sortable IDs (alphabetical = chronological).
-    Events are stored in a dictionary for O(1) lookup, with separate sorted indexes for
+    Events are stored in a dictionary for O(1) lookup, with a sorted master index for
     efficient retrieval. The memory can be fully reconstructed from its event list.
 
     Architecture:
         - DATA LAYER: events dict (stamp → event object) - single source of truth
-        - INDEX LAYER: idx_* lists of [timestamp, stamp] pairs, sorted chronologically
+        - INDEX LAYER: idx_all list of [timestamp, stamp] pairs, sorted chronologically;
+          per-type views (idx_msgs etc.) are derived from it on demand
         - VARIABLE LAYER: vars dict with full history as list of [stamp, value] pairs
         - OBJECT LAYER: objects dict for compressed large data storage
 
     Attributes:
         id (str): Unique identifier for this MEMORY instance (event_stamp).
         events (dict): Dictionary mapping event stamps to full event objects.
-        idx_msgs (list): Sorted list of [timestamp, stamp] pairs for messages.
-        idx_refs (list): Sorted list of [timestamp, stamp] pairs for reflections.
-        idx_logs (list): Sorted list of [timestamp, stamp] pairs for logs.
-        idx_vars (list): Sorted list of [timestamp, stamp] pairs for variable changes.
         idx_all (list): Master sorted list of all [timestamp, stamp] pairs.
+        idx_msgs (list): Read-only view of idx_all filtered to messages.
+        idx_refs (list): Read-only view of idx_all filtered to reflections.
+        idx_logs (list): Read-only view of idx_all filtered to logs.
+        idx_vars (list): Read-only view of idx_all filtered to variable changes.
         vars (dict): Dictionary mapping variable names to list of [stamp, value] pairs.
                      Deleted variables have VAR_DELETED as the value in their last entry.
                      Large values auto-convert to object references: {'_obj_ref': stamp}.
@@ -76,6 +225,8 @@ class MEMORY:
         objects (dict): Dictionary mapping stamps to compressed object dicts.
                         Each object is JSON-serializable with base64-encoded compressed data.
         object_threshold (int): Size threshold (bytes) for auto-converting vars to objects.
+        object_compression_level (int): Compression level for stored objects (default 6).
+        object_codec (str): 'zlib' (default) or 'zstd' (needs the zstandard package).
         valid_roles (set): Set of valid roles for messages.
         valid_modes (set): Set of valid modes for messages.
         valid_channels (set): Set of valid communication channels.
@@ -176,20 +327,20 @@ class MEMORY:
         # DATA LAYER: Single source of truth for all events
         self.events = {}            # stamp → full event dict
         
-        # INDEX LAYER: Sorted lists of [timestamp, stamp] pairs
+        # INDEX LAYER: Sorted list of [timestamp, stamp] pairs
         # Format: [[dt_utc, stamp], ...] - aligns with Redis sorted set structure
         # Sorted by timestamp (ISO string sorts chronologically)
-        self.idx_msgs = []          # Message [timestamp, stamp] pairs
-        self.idx_refs = []          # Reflection [timestamp, stamp] pairs
-        self.idx_logs = []          # Log [timestamp, stamp] pairs
-        self.idx_vars = []          # Variable-change [timestamp, stamp] pairs
         self.idx_all  = []          # Master index (all [timestamp, stamp] pairs)
+        self._idx_by_type = {}      # Lazy per-type views of idx_all, reset on store
+        self._last_stamp = {}       # (type, role or None) → newest stamp, or None if none
+        self._context_cache = {}    # include_roles → msg events, kept by _store_event
+        self._parsed_dt = {}        # dt string → datetime, filled by render's time_range filter
         
         # VARIABLE LAYER: Full history with timestamps
         # vars[key] = [[stamp1, value1], [stamp2, value2], ...]
         # Deleted variables have VAR_DELETED as value in their last entry
-        self.vars = {}              # var_name → list of [stamp, value] pairs
-        self.var_desc_history = {}  # var_name → list of [stamp, description] pairs
+        self.vars = defaultdict(list)              # var_name → list of [stamp, value] pairs
+        self.var_desc_history = defaultdict(list)  # var_name → list of [stamp, description] pairs
         
         # OBJECT LAYER: Compressed storage for large data
         # objects[stamp] = {
@@ -203,6 +354,10 @@ class MEMORY:
         # Threshold for auto-converting variables to objects (bytes)
         self.object_threshold = 10000  # 10KB default
         
+        # Codec and level used when compressing objects
+        self.object_codec = DEFAULT_COMPRESSION_CODEC
+        self.object_compression_level = DEFAULT_COMPRESSION_LEVEL
+        
         # Valid values
         self.valid_roles = {
             'system',
@@ -237,17 +392,29 @@ class MEMORY:
         """
         Insert [timestamp, stamp] pair maintaining sorted order by timestamp.
         
+        Events almost always arrive in order, so the pair is appended in
+        O(1); insort is only used when it would sort before the tail.
+        Ties on timestamp still order by stamp, exactly as insort would.
+        
         Args:
             index_list: One of the idx_* lists
             timestamp: ISO timestamp string (dt_utc)
             stamp: Event stamp ID
+            
+        Returns:
+            True if the pair was appended at the tail, False if inserted earlier
         """
-        # bisect.insort sorts by first element of tuple/list (timestamp)
-        bisect.insort(index_list, [timestamp, stamp])
+        pair = [timestamp, stamp]
+        if not index_list or pair >= index_list[-1]:
+            index_list.append(pair)
+            return True
+        # insort sorts by first element of tuple/list (timestamp)
+        insort(index_list, pair)
+        return False
 
     def _store_event(self, event_type, obj):
         """
-        Store event in data layer and add to appropriate indexes.
+        Store event in data layer and add it to the master index.
         This is the single entry point for all event creation.
         
         Args:
@@ -255,38 +422,144 @@ class MEMORY:
             obj: The full event dict (must contain 'stamp' and 'dt_utc' keys)
         """
         stamp = obj['stamp']
-        timestamp = obj['dt_utc']
         
         # Store in data layer
         self.events[stamp] = obj
         
-        # Add to type-specific index (with [timestamp, stamp] format)
-        if event_type == 'msg':
-            self._add_to_index(self.idx_msgs, timestamp, stamp)
-        elif event_type == 'ref':
-            self._add_to_index(self.idx_refs, timestamp, stamp)
-        elif event_type == 'log':
-            self._add_to_index(self.idx_logs, timestamp, stamp)
-        elif event_type == 'var':
-            self._add_to_index(self.idx_vars, timestamp, stamp)
+        # Single master index; per-type views are rebuilt on next access
+        if self._add_to_index(self.idx_all, obj['dt_utc'], stamp):
+            last = self._last_stamp
+            role = obj.get('role')
+            last[(event_type, None)] = stamp
+            last[(event_type, role)] = stamp
+            if event_type == 'msg':
+                for roles, msgs in self._context_cache.items():
+                    if not roles or role in roles:  # () means all roles, as in get_msgs
+                        msgs.append(obj)
+        else:
+            # Out-of-order timestamp (rare): keep events in index order
+            self._sync_event_order()
+            self._last_stamp.clear()
+            self._context_cache.clear()
+        self._idx_by_type.clear()
+
+    def _sync_event_order(self):
+        """
+        Reorder the events dict (in place) to follow idx_all.
+        
+        The events dict doubles as the chronological index for reads, so its
+        insertion order must match idx_all. Events missing from idx_all are
+        kept, after the indexed ones.
+        """
+        events = self.events
+        ordered = {stamp: events[stamp] for _, stamp in self.idx_all if stamp in events}
+        if len(ordered) < len(events):
+            for stamp, ev in events.items():
+                ordered.setdefault(stamp, ev)
+        events.clear()
+        events.update(ordered)
+
+    def _type_index(self, event_type):
+        """
+        Get the [timestamp, stamp] pairs of idx_all for one event type.
+        
+        Built lazily from idx_all and cached until the next event is stored.
         
-        # Always add to master index
-        self._add_to_index(self.idx_all, timestamp, stamp)
+        Args:
+            event_type: One of 'msg', 'ref', 'log', 'var'
+            
+        Returns:
+            Sorted list of [timestamp, stamp] pairs
+        """
+        pairs = self._idx_by_type.get(event_type)
+        if pairs is None:
+            events = self.events
+            pairs = [
+                pair for pair in self.idx_all
+                if pair[1] in events and events[pair[1]].get('type', 'msg') == event_type
+            ]
+            self._idx_by_type[event_type] = pairs
+        return pairs
+
+    @property
+    def idx_msgs(self):
+        """Sorted [timestamp, stamp] pairs for messages (derived from idx_all)."""
+        return self._type_index('msg')
+
+    @property
+    def idx_refs(self):
+        """Sorted [timestamp, stamp] pairs for reflections (derived from idx_all)."""
+        return self._type_index('ref')
+
+    @property
+    def idx_logs(self):
+        """Sorted [timestamp, stamp] pairs for logs (derived from idx_all)."""
+        return self._type_index('log')
+
+    @property
+    def idx_vars(self):
+        """Sorted [timestamp, stamp] pairs for variable changes (derived from idx_all)."""
+        return self._type_index('var')
 
-    def _get_events_from_index(self, index, limit=-1):
+    def _last_event(self, event_type, role=None):
         """
-        Get events from an index, optionally limited to last N.
+        Get the newest event of a type (and optionally role) in O(1).
+        
+        Served from the _last_stamp pointers kept by _store_event; on a miss
+        the events are scanned newest-first once and the result remembered.
+        
+        Args:
+            event_type: One of 'msg', 'ref', 'log', 'var'
+            role: Only match events with this role (None = any)
+            
+        Returns:
+            Event dict, or None if there is no such event
+        """
+        key = (event_type, role)
+        if key in self._last_stamp:
+            stamp = self._last_stamp[key]
+            if stamp is None:
+                return None
+            ev = self.events.get(stamp)
+            if ev is not None:
+                return ev
+        
+        found = None
+        for stamp, ev in reversed(self.events.items()):
+            if ev.get('type', 'msg') == event_type and (role is None or ev.get('role') == role):
+                found = stamp
+                break
+        self._last_stamp[key] = found
+        return self.events[found] if found is not None else None
+
+    def _get_events(self, limit=-1, event_type=None):
+        """
+        Get events in chronological order, optionally limited to last N.
+        
+        The events dict is kept in idx_all order, so it is read directly;
+        with a limit only the tail is walked (newest first, then reversed).
         
         Args:
-            index: One of the idx_* lists (format: [[timestamp, stamp], ...])
             limit: Max events to return (-1 = all)
+            event_type: Only return events of this type, e.g. 'msg' (None = all)
             
         Returns:
             List of event dicts
         """
-        pairs = index if limit <= 0 else index[-limit:]
-        # Extract stamp (second element) from each [timestamp, stamp] pair
-        return [self.events[ts_stamp[1]] for ts_stamp in pairs if ts_stamp[1] in self.events]
+        events = self.events.values()
+        if event_type is None:
+            if limit <= 0:
+                return list(events)
+            result = list(islice(reversed(events), limit))
+        else:
+            if limit <= 0:
+                return [e for e in events if e.get('type', 'msg') == event_type]
+            result = list(islice(
+                (e for e in reversed(events) if e.get('type', 'msg') == event_type),
+                limit,
+            ))
+        result.reverse()
+        return result
 
     def _get_latest_desc(self, key):
         """
@@ -327,16 +600,15 @@ class MEMORY:
             raise ValueError("metadata must be a dict or None")
         
         stamp = event_stamp({'role': role, 'content': content})
-        msg = {
-            'stamp'   : stamp,
-            'type'    : 'msg',
-            'role'    : role,
-            'content' : content,
-            'mode'    : mode,
-            'channel' : channel,
-            'dt_bog'  : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'  : str(dtt.datetime.now(tz_utc))[:23],
-        }
+        dt_bog, dt_utc = _now_strings()
+        msg = _MSG_PROTO.copy()
+        msg['stamp'] = stamp
+        msg['role'] = role
+        msg['content'] = content
+        msg['mode'] = mode
+        msg['channel'] = channel
+        msg['dt_bog'] = dt_bog
+        msg['dt_utc'] = dt_utc
         if metadata:
             msg['metadata'] = metadata
         self._store_event('msg', msg)
@@ -378,15 +650,12 @@ class MEMORY:
             message: Log message content
         """
         stamp = event_stamp({'content': message})
-        log_entry = {
-            'stamp'   : stamp,
-            'type'    : 'log',
-            'role'    : 'logger',
-            'content' : message,
-            'mode'    : 'text',
-            'dt_bog'  : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'  : str(dtt.datetime.now(tz_utc))[:23],
-        }
+        dt_bog, dt_utc = _now_strings()
+        log_entry = _LOG_PROTO.copy()
+        log_entry['stamp'] = stamp
+        log_entry['content'] = message
+        log_entry['dt_bog'] = dt_bog
+        log_entry['dt_utc'] = dt_utc
         self._store_event('log', log_entry)
 
     def add_ref(self, content):
@@ -397,15 +666,12 @@ class MEMORY:
             content: Reflection content
         """
         stamp = event_stamp({'content': content})
-        ref = {
-            'stamp'   : stamp,
-            'type'    : 'ref',
-            'role'    : 'reflection',
-            'content' : content,
-            'mode'    : 'text',
-            'dt_bog'  : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'  : str(dtt.datetime.now(tz_utc))[:23],
-        }
+        dt_bog, dt_utc = _now_strings()
+        ref = _REF_PROTO.copy()
+        ref['stamp'] = stamp
+        ref['content'] = content
+        ref['dt_bog'] = dt_bog
+        ref['dt_utc'] = dt_utc
         self._store_event('ref', ref)
 
     def add_exchange(self, kind, key, service, model, request, response):
@@ -426,6 +692,7 @@ class MEMORY:
             response: JSON-serializable response payload.
         """
         stamp = event_stamp({'key': key, 'kind': kind})
+        dt_bog, dt_utc = _now_strings()
         exchange = {
             'stamp'    : stamp,
             'type'     : 'llm',
@@ -436,8 +703,8 @@ class MEMORY:
             'model'    : model,
             'request'  : request,
             'response' : response,
-            'dt_bog'   : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'   : str(dtt.datetime.now(tz_utc))[:23],
+            'dt_bog'   : dt_bog,
+            'dt_utc'   : dt_utc,
         }
         self._store_event('llm', exchange)
 
@@ -493,13 +760,14 @@ class MEMORY:
             Messages in the specified format
         """
         # Get all messages from index
-        events = self._get_events_from_index(self.idx_msgs, -1)
+        events = self._get_events(event_type='msg')
         
-        # Apply filters
+        # Apply filters (role lists become sets once, for O(1) membership)
         if include:
+            include = _filter_set(include)
             events = [e for e in events if e.get('role') in include]
         if exclude:
-            exclude = exclude or []
+            exclude = _filter_set(exclude)
             events = [e for e in events if e.get('role') not in exclude]
         if channel:
             events = [e for e in events if e.get('channel') == channel]
@@ -583,7 +851,10 @@ class MEMORY:
         Returns:
             List of event dicts
         """
-        events = self._get_events_from_index(self.idx_all, -1)
+        if not event_types and not channel:
+            return self._get_events(limit)
+        
+        events = self._get_events()
         
         if event_types:
             events = [e for e in events if e.get('type') in event_types]
@@ -605,12 +876,7 @@ class MEMORY:
         Returns:
             List of log event dicts
         """
-        events = self._get_events_from_index(self.idx_logs, -1)
-        
-        if limit > 0:
-            events = events[-limit:]
-        
-        return events
+        return self._get_events(limit, event_type='log')
 
     def get_refs(self, limit=-1):
         """
@@ -622,12 +888,7 @@ class MEMORY:
         Returns:
             List of reflection event dicts
         """
-        events = self._get_events_from_index(self.idx_refs, -1)
-        
-        if limit > 0:
-            events = events[-limit:]
-        
-        return events
+        return self._get_events(limit, event_type='ref')
 
     def last_user_msg(self, content_only=False):
         """
@@ -641,10 +902,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no messages.
         """
-        msgs = self.get_msgs(include=['user'])
-        if not msgs:
+        ev = self._last_event('msg', 'user')
+        if ev is None:
             return '' if content_only else None
-        return msgs[-1]['content'] if content_only else msgs[-1]
+        return ev['content'] if content_only else ev
 
     def last_asst_msg(self, content_only=False):
         """
@@ -658,10 +919,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no messages.
         """
-        msgs = self.get_msgs(include=['assistant'])
-        if not msgs:
+        ev = self._last_event('msg', 'assistant')
+        if ev is None:
             return '' if content_only else None
-        return msgs[-1]['content'] if content_only else msgs[-1]
+        return ev['content'] if content_only else ev
 
     def last_sys_msg(self, content_only=False):
         """
@@ -675,10 +936,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no messages.
         """
-        msgs = self.get_msgs(include=['system'])
-        if not msgs:
+        ev = self._last_event('msg', 'system')
+        if ev is None:
             return '' if content_only else None
-        return msgs[-1]['content'] if content_only else msgs[-1]
+        return ev['content'] if content_only else ev
 
     def last_log_msg(self, content_only=False):
         """
@@ -692,10 +953,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no logs.
         """
-        logs = self.get_logs()
-        if not logs:
+        ev = self._last_event('log')
+        if ev is None:
             return '' if content_only else None
-        return logs[-1]['content'] if content_only else logs[-1]
+        return ev['content'] if content_only else ev
 
     def last_result_msg(self, content_only=False):
         """
@@ -709,10 +970,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no result messages.
         """
-        msgs = self.get_msgs(include=['result'])
-        if not msgs:
+        ev = self._last_event('msg', 'result')
+        if ev is None:
             return '' if content_only else None
-        return msgs[-1]['content'] if content_only else msgs[-1]
+        return ev['content'] if content_only else ev
 
     def last_ref(self, content_only=False):
         """
@@ -726,10 +987,10 @@ class MEMORY:
             dict or str: Full event dict, or content string if content_only=True.
                          Returns None (or '' if content_only) if no reflections.
         """
-        refs = self.get_refs()
-        if not refs:
+        ev = self._last_event('ref')
+        if ev is None:
             return '' if content_only else None
-        return refs[-1]['content'] if content_only else refs[-1]
+        return ev['content'] if content_only else ev
 
     def prepare_context(
         self,
@@ -773,8 +1034,14 @@ class MEMORY:
                 messages=context
             )
         """
-        # Get all messages for included roles
-        msgs = self.get_msgs(include=list(include_roles))
+        # Messages for these roles are kept up to date by _store_event, so
+        # repeated calls (one per chat turn) don't rescan every event. The
+        # returned dicts are always built fresh, so callers may edit them.
+        roles = tuple(include_roles)
+        msgs = self._context_cache.get(roles)
+        if msgs is None:
+            msgs = self.get_msgs(include=roles)
+            self._context_cache[roles] = msgs
         
         if not msgs:
             return []
@@ -783,34 +1050,37 @@ class MEMORY:
         # Messages at index < cutoff_idx are candidates for truncation
         cutoff_idx = max(0, len(msgs) - recent_count)
         
+        def truncated_content(msg):
+            return truncate_content(
+                msg.get('content', ''), 
+                msg.get('stamp', ''), 
+                threshold=truncate_threshold,
+                header_len=header_len,
+                footer_len=footer_len
+            )
+        
+        if format == 'openai':
+            # OpenAI expects 'user', 'assistant', 'system' roles
+            result = []
+            for i, msg in enumerate(msgs):
+                content = msg.get('content', '')
+                if i < cutoff_idx and len(content) > truncate_threshold:
+                    content = truncated_content(msg)
+                result.append({'role': msg.get('role', 'user'), 'content': content})
+            return result
+        
+        # List format includes more metadata. One decision per message:
+        # older and over the threshold; only those are truncated.
         result = []
         for i, msg in enumerate(msgs):
-            stamp = msg.get('stamp', '')
-            role = msg.get('role', 'user')
             content = msg.get('content', '')
-            
-            # Apply truncation to older messages
-            if i < cutoff_idx:
-                content = truncate_content(
-                    content, 
-                    stamp, 
-                    threshold=truncate_threshold,
-                    header_len=header_len,
-                    footer_len=footer_len
-                )
-            
-            if format == 'openai':
-                # OpenAI expects 'user', 'assistant', 'system' roles
-                result.append({'role': role, 'content': content})
-            else:
-                # List format includes more metadata
-                result.append({
-                    'role': role,
-                    'content': content,
-                    'stamp': stamp,
-                    'truncated': i < cutoff_idx and len(msg.get('content', '')) > truncate_threshold,
-                })
-        
+            truncated = i < cutoff_idx and len(content) > truncate_threshold
+            result.append({
+                'role': msg.get('role', 'user'),
+                'content': truncated_content(msg) if truncated else content,
+                'stamp': msg.get('stamp', ''),
+                'truncated': truncated,
+            })
         return result
 
     #---
@@ -832,48 +1102,57 @@ class MEMORY:
             value: Variable value (any type)
             desc: Optional description (appended to description history if provided)
         """
-        # Check if value should be stored as object (auto-conversion)
-        value_size = estimate_size(value)
-        if value_size > self.object_threshold:
+        cls = type(value)
+        if cls in _SCALAR_TYPES and (cls is not float or math.isfinite(value)):
+            # Scalars: repr() is both the stamp preview and (to within a
+            # character) the JSON size, so skip the serialization pass.
+            # Non-finite floats are excluded: 'inf' is written as 'Infinity'.
+            preview = repr(value)
+            is_large = len(preview) > self.object_threshold
+            preview = preview[:100]
+        else:
+            preview = str(value)[:100]
+            is_large = None
+        
+        # Check if value should be stored as object (auto-conversion).
+        # Serialize once: the bytes are both measured and compressed.
+        if is_large is None or is_large:
+            raw_bytes, content_type = encode_value(value)
+            is_large = len(raw_bytes) > self.object_threshold
+        if is_large:
             # Store as object, use reference in history
-            obj_stamp = event_stamp({'obj': str(value)[:50]})
-            compressed_obj = compress_to_json(value)
+            obj_stamp = event_stamp({'obj': preview[:50]})
+            compressed_obj = compress_encoded(
+                raw_bytes, content_type,
+                level=self.object_compression_level, codec=self.object_codec,
+            )
             self.objects[obj_stamp] = compressed_obj
             stored_value = {'_obj_ref': obj_stamp}
         else:
             stored_value = value
         
-        stamp = event_stamp({'var': key, 'value': str(value)[:100]})
-        
-        # Initialize history list if this is a new variable
-        if key not in self.vars:
-            self.vars[key] = []
+        stamp = event_stamp({'var': key, 'value': preview})
+        dt_bog, dt_utc = _now_strings()
         
-        # Append new [stamp, stored_value] pair to history
+        # Append new [stamp, stored_value] pair to history (created on first set)
         self.vars[key].append([stamp, stored_value])
         
         # Track description changes separately (only when provided)
         if desc:
-            if key not in self.var_desc_history:
-                self.var_desc_history[key] = []
             self.var_desc_history[key].append([stamp, desc])
         
         # Get latest description from history (or the one we just set)
         current_desc = desc if desc else self._get_latest_desc(key)
         
         # Create variable-change event
-        var_event = {
-            'stamp'    : stamp,
-            'type'     : 'var',
-            'role'     : 'system',
-            'var_name' : key,
-            'var_value': stored_value,  # Store reference if large, else value
-            'var_desc' : current_desc,
-            'content'  : "Variable '{}' set".format(key) + (' (as object ref)' if is_obj_ref(stored_value) else ''),
-            'mode'     : 'text',
-            'dt_bog'   : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'   : str(dtt.datetime.now(tz_utc))[:23],
-        }
+        var_event = _VAR_PROTO.copy()
+        var_event['stamp'] = stamp
+        var_event['var_name'] = key
+        var_event['var_value'] = stored_value  # Store reference if large, else value
+        var_event['var_desc'] = current_desc
+        var_event['content'] = f"Variable '{key}' set{' (as object ref)' if is_large else ''}"
+        var_event['dt_bog'] = dt_bog
+        var_event['dt_utc'] = dt_utc
         self._store_event('var', var_event)
 
     def del_var(self, key):
@@ -888,9 +1167,10 @@ class MEMORY:
             KeyError: If the variable doesn't exist
         """
         if key not in self.vars:
-            raise KeyError("Variable '{}' does not exist".format(key))
+            raise KeyError(f"Variable '{key}' does not exist")
         
         stamp = event_stamp({'var': key, 'action': 'delete'})
+        dt_bog, dt_utc = _now_strings()
         
         # Append deletion marker to history
         self.vars[key].append([stamp, VAR_DELETED])
@@ -904,10 +1184,10 @@ class MEMORY:
             'var_value': None,
             'var_deleted': True,
             'var_desc' : self._get_latest_desc(key),
-            'content'  : "Variable '{}' deleted".format(key),
+            'content'  : f"Variable '{key}' deleted",
             'mode'     : 'text',
-            'dt_bog'   : str(dtt.datetime.now(tz_bog))[:23],
-            'dt_utc'   : str(dtt.datetime.now(tz_utc))[:23],
+            'dt_bog'   : dt_bog,
+            'dt_utc'   : dt_utc,
         }
         self._store_event('var', var_event)
 
@@ -936,12 +1216,62 @@ class MEMORY:
         if last_value is VAR_DELETED:
             return None
         
-        # Resolve object reference if applicable
-        if resolve_refs and is_obj_ref(last_value):
+        # Resolve object reference if applicable (inline is_obj_ref; refs are
+        # always plain dicts, so an exact type check is enough)
+        if resolve_refs and type(last_value) is dict and '_obj_ref' in last_value:
             return self.get_obj(last_value['_obj_ref'])
         
         return last_value
 
+    def get_var_head_tail(self, key, header_len=200, footer_len=200):
+        """
+        Return the start and end of a variable's text without loading all of it.
+        
+        For large variables stored as objects, only enough of the compressed
+        payload is decompressed to produce the head (and a bounded window for
+        the tail), instead of materializing the whole value. Useful for
+        previewing big vars in LLM context, as truncate_content does for messages.
+        
+        Text vars are sliced by characters, bytes vars by bytes, and other
+        values by their JSON text.
+        
+        Args:
+            key: Variable name
+            header_len: Characters (or bytes) to keep from the start
+            footer_len: Characters (or bytes) to keep from the end (0 = none)
+            
+        Returns:
+            tuple: (head, tail), or None if not found or deleted
+        
+        Raises:
+            ValueError: If the value is stored pickled (no text form)
+        """
+        value = self.get_var(key, resolve_refs=False)
+        if value is None:
+            return None
+        
+        if not is_obj_ref(value):
+            if not isinstance(value, (str, bytes)):
+                try:
+                    value = json.dumps(value)
+                except (TypeError, ValueError):
+                    value = str(value)
+            return value[:header_len], value[-footer_len:] if footer_len else value[:0]
+        
+        obj_dict = self.objects[value['_obj_ref']]
+        content_type = obj_dict['content_type']
+        if content_type == 'pickle':
+            raise ValueError("Variable '{}' is stored pickled and has no text form".format(key))
+        if content_type == 'bytes':
+            return decompress_head_tail(obj_dict, header_len, footer_len)
+        
+        # UTF-8 uses at most 4 bytes per character; partial characters at the
+        # cut points are dropped before slicing to the exact length.
+        head, tail = decompress_head_tail(obj_dict, 4 * header_len, 4 * footer_len)
+        head = head.decode('utf-8', errors='ignore')[:header_len]
+        tail = tail.decode('utf-8', errors='ignore')
+        return head, tail[-footer_len:] if footer_len else ''
+
     def is_var_deleted(self, key):
         """
         Check if a variable is currently marked as deleted.
@@ -959,6 +1289,30 @@ class MEMORY:
         last_stamp, last_value = history[-1]
         return last_value is VAR_DELETED
 
+    def get_vars(self, keys, resolve_refs=True):
+        """
+        Get the current values of several variables in one call.
+        
+        Args:
+            keys: Iterable of variable names
+            resolve_refs: If True (default), resolve object references to actual data
+        
+        Returns:
+            dict: Variable name → current value, for each key that exists and
+                is not deleted
+        """
+        result = {}
+        for key in keys:
+            history = self.vars.get(key)
+            if history:
+                last_value = history[-1][1]
+                if last_value is not VAR_DELETED:
+                    if resolve_refs and type(last_value) is dict and '_obj_ref' in last_value:
+                        result[key] = self.get_obj(last_value['_obj_ref'])
+                    else:
+                        result[key] = last_value
+        return result
+
     def get_all_vars(self, resolve_refs=True):
         """
         Get a dictionary of all current non-deleted variable values.
@@ -975,7 +1329,7 @@ class MEMORY:
                 last_stamp, last_value = history[-1]
                 if last_value is not VAR_DELETED:
                     # Resolve object reference if applicable
-                    if resolve_refs and is_obj_ref(last_value):
+                    if resolve_refs and type(last_value) is dict and '_obj_ref' in last_value:
                         result[key] = self.get_obj(last_value['_obj_ref'])
                     else:
                         result[key] = last_value
@@ -1003,7 +1357,7 @@ class MEMORY:
         # Resolve object references
         resolved = []
         for stamp, value in history:
-            if is_obj_ref(value):
+            if type(value) is dict and '_obj_ref' in value:
                 resolved.append([stamp, self.get_obj(value['_obj_ref'])])
             else:
                 resolved.append([stamp, value])
@@ -1063,7 +1417,9 @@ class MEMORY:
         stamp = event_stamp({'obj': str(data)[:50]})
         
         # Compress and store
-        compressed_obj = compress_to_json(data, content_type)
+        compressed_obj = compress_to_json(
+            data, content_type, level=self.object_compression_level, codec=self.object_codec
+        )
         self.objects[stamp] = compressed_obj
         
         # Optionally create a variable reference
@@ -1071,18 +1427,13 @@ class MEMORY:
             obj_ref = {'_obj_ref': stamp}
             # Store reference directly in vars (bypassing size check)
             var_stamp = event_stamp({'var': name})
+            dt_bog, dt_utc = _now_strings()
             
-            # Initialize history if needed
-            if name not in self.vars:
-                self.vars[name] = []
-            
-            # Append [stamp, obj_ref] to history
+            # Append [stamp, obj_ref] to history (created on first set)
             self.vars[name].append([var_stamp, obj_ref])
             
             # Track description changes separately (only when provided)
             if desc:
-                if name not in self.var_desc_history:
-                    self.var_desc_history[name] = []
                 self.var_desc_history[name].append([var_stamp, desc])
             
             # Get latest description for the event
@@ -1096,10 +1447,10 @@ class MEMORY:
                 'var_value': obj_ref,  # Store the reference, not the data
                 'var_deleted': False,
                 'var_desc' : current_desc,
-                'content'  : "Variable '{}' set to object ref: {}".format(name, stamp),
+                'content'  : f"Variable '{name}' set to object ref: {stamp}",
                 'mode'     : 'text',
-                'dt_bog'   : str(dtt.datetime.now(tz_bog))[:23],
-                'dt_utc'   : str(dtt.datetime.now(tz_utc))[:23],
+                'dt_bog'   : dt_bog,
+                'dt_utc'   : dt_utc,
             }
             self._store_event('var', var_event)
         
@@ -1160,22 +1511,31 @@ class MEMORY:
             'objects': dict(self.objects),  # All objects by stamp (already JSON-serializable)
         }
 
-    def save(self, filename, compressed=False):
+    def save(self, filename, compressed=False, codec='gzip'):
         """
         Save memory to file.
         
         Args:
             filename: Path to save file
-            compressed: If True, use gzip compression
-        """
-        import gzip
-        data = self.snapshot()
-        if compressed:
-            with gzip.open(filename, 'wb') as f:
-                pickle.dump(data, f)
-        else:
+            compressed: If True, compress the pickle with `codec`
+            codec: 'gzip' (default) or 'zstd' (requires the zstandard package;
+                   faster than gzip at a similar ratio)
+        """
+        # Same layout as snapshot(), but without its defensive copies: pickle
+        # only reads the dicts, so copying them would just double peak memory.
+        data = {'id': self.id, 'events': self.events, 'objects': self.objects}
+        if not compressed:
             with open(filename, 'wb') as f:
-                pickle.dump(data, f)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        elif codec == 'zstd':
+            cctx = _require_zstd().ZstdCompressor(level=3, threads=-1)
+            with open(filename, 'wb') as f, cctx.stream_writer(f) as w:
+                pickle.dump(data, w, protocol=pickle.HIGHEST_PROTOCOL)
+        elif codec == 'gzip':
+            with gzip.open(filename, 'wb', compresslevel=_SAVE_GZIP_LEVEL) as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            raise ValueError("Unknown codec: {}".format(codec))
 
     def load(self, filename, compressed=False):
         """
@@ -1183,15 +1543,22 @@ class MEMORY:
         
         Args:
             filename: Path to load file
-            compressed: If True, expect gzip compression
+            compressed: If True, expect a compressed file (gzip or zstd,
+                        detected from the file header)
         """
-        import gzip
-        if compressed:
-            with gzip.open(filename, 'rb') as f:
+        if not compressed:
+            with open(filename, 'rb') as f:
                 data = pickle.load(f)
         else:
             with open(filename, 'rb') as f:
-                data = pickle.load(f)
+                is_zstd = f.read(4) == _ZSTD_MAGIC
+            if is_zstd:
+                dctx = _require_zstd().ZstdDecompressor()
+                with open(filename, 'rb') as f, dctx.stream_reader(f) as r:
+                    data = pickle.load(r)
+            else:
+                with gzip.open(filename, 'rb') as f:
+                    data = pickle.load(f)
         
         # Rehydrate from events (pass objects if present)
         event_list = list(data.get('events', {}).values())
@@ -1201,11 +1568,10 @@ class MEMORY:
         # Copy state to self
         self.id = mem.id
         self.events = mem.events
-        self.idx_msgs = mem.idx_msgs
-        self.idx_refs = mem.idx_refs
-        self.idx_logs = mem.idx_logs
-        self.idx_vars = mem.idx_vars
         self.idx_all = mem.idx_all
+        self._idx_by_type = {}
+        self._last_stamp = {}
+        self._context_cache = {}
         self.vars = mem.vars
         self.var_desc_history = mem.var_desc_history
         self.objects = mem.objects
@@ -1237,18 +1603,13 @@ class MEMORY:
         """
         # Prepare data for JSON serialization
         # Need to handle VAR_DELETED sentinel in vars history
-        def serialize_var_history(var_dict):
+        def serialize_var_history(var_dict, _deleted=VAR_DELETED, _marker='__VAR_DELETED__'):
             """Convert VAR_DELETED sentinel to JSON-safe marker."""
-            result = {}
-            for key, history in var_dict.items():
-                serialized_history = []
-                for stamp, value in history:
-                    if value is VAR_DELETED:
-                        serialized_history.append([stamp, '__VAR_DELETED__'])
-                    else:
-                        serialized_history.append([stamp, value])
-                result[key] = serialized_history
-            return result
+            return {
+                key: [[stamp, _marker] if value is _deleted else [stamp, value]
+                      for stamp, value in history]
+                for key, history in var_dict.items()
+            }
         
         data = {
             'version': '1.0',
@@ -1256,7 +1617,7 @@ class MEMORY:
             'events': self.events,
             'objects': self.objects,
             'vars': serialize_var_history(self.vars),
-            'var_desc_history': self.var_desc_history,
+            'var_desc_history': dict(self.var_desc_history),
             'idx_msgs': self.idx_msgs,
             'idx_refs': self.idx_refs,
             'idx_logs': self.idx_logs,
@@ -1264,13 +1625,14 @@ class MEMORY:
             'idx_all': self.idx_all,
         }
         
-        json_str = json.dumps(data, indent=indent, ensure_ascii=False)
+        # UTF-8 bytes (via orjson when installed), written to disk as-is
+        payload = json_dumps_document(data, indent=indent)
         
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(json_str)
+            with open(filename, 'wb') as f:
+                f.write(payload)
             return None
-        return json_str
+        return payload.decode('utf-8')
 
     @classmethod
     def from_json(cls, source):
@@ -1293,8 +1655,6 @@ class MEMORY:
             # Load from JSON string
             memory = MEMORY.from_json(json_str)
         """
-        import os
-        
         # Determine if source is a file or JSON string
         if os.path.isfile(source):
             with open(source, 'r', encoding='utf-8') as f:
@@ -1303,31 +1663,26 @@ class MEMORY:
             data = json.loads(source)
         
         # Helper to restore VAR_DELETED sentinel
-        def deserialize_var_history(var_dict):
+        def deserialize_var_history(var_dict, _deleted=VAR_DELETED, _marker='__VAR_DELETED__'):
             """Convert JSON marker back to VAR_DELETED sentinel."""
-            result = {}
-            for key, history in var_dict.items():
-                deserialized_history = []
-                for stamp, value in history:
-                    if value == '__VAR_DELETED__':
-                        deserialized_history.append([stamp, VAR_DELETED])
-                    else:
-                        deserialized_history.append([stamp, value])
-                result[key] = deserialized_history
-            return result
+            return {
+                key: [[stamp, _deleted] if value == _marker else [stamp, value]
+                      for stamp, value in history]
+                for key, history in var_dict.items()
+            }
         
         # Create new instance
         mem = cls()
         mem.id = data.get('id', mem.id)
         mem.events = data.get('events', {})
+        for ev in mem.events.values():
+            _intern_event(ev)
         mem.objects = data.get('objects', {})
-        mem.vars = deserialize_var_history(data.get('vars', {}))
-        mem.var_desc_history = data.get('var_desc_history', {})
-        mem.idx_msgs = data.get('idx_msgs', [])
-        mem.idx_refs = data.get('idx_refs', [])
-        mem.idx_logs = data.get('idx_logs', [])
-        mem.idx_vars = data.get('idx_vars', [])
+        mem.vars = defaultdict(list, deserialize_var_history(data.get('vars', {})))
+        mem.var_desc_history = defaultdict(list, data.get('var_desc_history', {}))
+        # Per-type idx_* keys are derived from idx_all, so only it is read
         mem.idx_all = data.get('idx_all', [])
+        mem._sync_event_order()
         
         return mem
 
@@ -1356,56 +1711,20 @@ class MEMORY:
         # Sort events by timestamp (dt_utc) for chronological order
         sorted_events = sorted(event_list, key=lambda e: e.get('dt_utc', ''))
         
+        events = mem.events
+        append_index = mem.idx_all.append
         for ev in sorted_events:
             stamp = ev.get('stamp')
-            timestamp = ev.get('dt_utc', '')
             if not stamp:
                 continue
             
-            event_type = ev.get('type', 'msg')
-            
-            # Store in data layer
-            mem.events[stamp] = ev
-            
-            # Create [timestamp, stamp] pair for indexes
-            ts_pair = [timestamp, stamp]
-            
-            # Add to appropriate index (direct append since already sorted by timestamp)
-            if event_type == 'msg':
-                mem.idx_msgs.append(ts_pair)
-            elif event_type == 'ref':
-                mem.idx_refs.append(ts_pair)
-            elif event_type == 'log':
-                mem.idx_logs.append(ts_pair)
-            elif event_type == 'var':
-                mem.idx_vars.append(ts_pair)
-                # Replay variable state into history list
-                var_name = ev.get('var_name')
-                if var_name:
-                    # Initialize history list if needed
-                    if var_name not in mem.vars:
-                        mem.vars[var_name] = []
-                    
-                    # Determine value (check for deletion marker)
-                    if ev.get('var_deleted', False):
-                        value = VAR_DELETED
-                    else:
-                        value = ev.get('var_value')
-                    
-                    # Append to history
-                    mem.vars[var_name].append([stamp, value])
-                    
-                    # Rebuild description history if present
-                    var_desc = ev.get('var_desc')
-                    if var_desc:
-                        if var_name not in mem.var_desc_history:
-                            mem.var_desc_history[var_name] = []
-                        # Only add if different from last description (avoid duplicates)
-                        desc_hist = mem.var_desc_history[var_name]
-                        if not desc_hist or desc_hist[-1][1] != var_desc:
-                            desc_hist.append([stamp, var_desc])
+            # Store in data layer; only var events need replaying into state
+            events[stamp] = ev = _intern_event(ev)
+            if ev.get('type', 'msg') == 'var':
+                _replay_var(mem, ev, stamp)
             
-            mem.idx_all.append(ts_pair)
+            # Direct append since already sorted by timestamp
+            append_index([ev.get('dt_utc', ''), stamp])
         
         return mem
 
@@ -1461,7 +1780,8 @@ class MEMORY:
             time_range: Tuple (start_dt, end_dt) to filter by datetime (None = all)
             event_limit: Max number of events to include (None = all)
             max_message_length: Max length per message (for 'conversation' format)
-            max_total_length: Max total length (for 'conversation' format)
+            max_total_length: Max total length (for 'conversation' format); the most
+                recent messages that fit are kept, older ones are dropped
             include_roles: Which roles to include (for 'conversation' format)
             message_separator: Separator between messages (for 'conversation' format)
             role_prefix: Whether to include role prefixes (for 'conversation' format)
@@ -1491,60 +1811,70 @@ class MEMORY:
             # Filter by channel
             print(mem.render(channel_filter='telegram'))
         """
-        from datetime import datetime
+        handler_name = self._RENDER_HANDLERS.get(format)
+        if handler_name is None:
+            raise ValueError("Unknown format: {}".format(format))
+        handler = getattr(self, handler_name)
 
         # Helper: flatten include to set for fast lookup
         include_set = set(include)
 
         # Helper: filter events by type using the new index-based retrieval
         def filter_events():
-            events = []
             if 'events' in include_set:
                 # Include all events from master index
-                events = self._get_events_from_index(self.idx_all, -1)
-            else:
-                # Selectively include types
-                if 'msgs' in include_set:
-                    events.extend(self._get_events_from_index(self.idx_msgs, -1))
-                if 'logs' in include_set:
-                    events.extend(self._get_events_from_index(self.idx_logs, -1))
-                if 'refs' in include_set:
-                    events.extend(self._get_events_from_index(self.idx_refs, -1))
-                if 'vars' in include_set:
-                    events.extend(self._get_events_from_index(self.idx_vars, -1))
-            return events
+                return self._get_events()
+            # Selectively include types in one chronological pass, so the
+            # result is already (nearly) in stamp order for sort_events
+            types = {_RENDER_TYPES[name] for name in include_set if name in _RENDER_TYPES}
+            if len(types) == 1:
+                return self._get_events(event_type=types.pop())
+            return [e for e in self.events.values() if e.get('type', 'msg') in types]
 
         # Helper: filter by role, mode, channel, content, and time
         def advanced_filter(evlist):
+            # Nothing to filter: hand the gathered list straight through
+            if not (role_filter or mode_filter or channel_filter or content_filter or time_range):
+                return evlist
+            # Compile the filters once: hashed sets for roles/modes, and the
+            # keyword(s) lowercased up front rather than per event
+            role_set = _filter_set(role_filter) if role_filter else None
+            mode_set = _filter_set(mode_filter) if mode_filter else None
+            if not content_filter:
+                needles = None
+            elif isinstance(content_filter, str):
+                needles = (content_filter.lower(),)
+            else:  # list of keywords
+                needles = tuple(kw.lower() for kw in content_filter)
+            
+            parsed_dt = self._parsed_dt
+            
+            # Cheapest, most selective checks first, so most rejects exit early
             filtered = []
             for ev in evlist:
-                # Role filter
-                if role_filter:
-                    ev_role = ev.get('role') or ev.get('type')
-                    if ev_role not in role_filter:
-                        continue
-                # Mode filter
-                if mode_filter and ev.get('mode') not in mode_filter:
-                    continue
                 # Channel filter
                 if channel_filter and ev.get('channel') != channel_filter:
                     continue
+                # Mode filter
+                if mode_set and ev.get('mode') not in mode_set:
+                    continue
+                # Role filter
+                if role_set and (ev.get('role') or ev.get('type')) not in role_set:
+                    continue
                 # Content filter
-                if content_filter:
-                    content = ev.get('content', '')
-                    if isinstance(content_filter, str):
-                        if content_filter.lower() not in content.lower():
-                            continue
-                    else:  # list of keywords
-                        if not any(kw.lower() in content.lower() for kw in content_filter):
-                            continue
+                if needles:
+                    content_low = ev.get('content', '').lower()
+                    if not any(kw in content_low for kw in needles):
+                        continue
                 # Time filter
                 if time_range:
-                    # Try to get timestamp from event
+                    # Try to get timestamp from event (parsed once per memory)
                     dt_str = ev.get('dt_utc') or ev.get('dt_bog')
                     if dt_str:
                         try:
-                            dt = datetime.fromisoformat(dt_str)
+                            dt = parsed_dt.get(dt_str)
+                            if dt is None:
+                                dt = parsed_dt[dt_str] = dtt.datetime.fromisoformat(dt_str)
                             start, end = time_range
                             if (start and dt < start) or (end and dt > end):
                                 continue
@@ -1556,6 +1886,7 @@ class MEMORY:
             return filtered
 
         # Helper: sort events by stamp (alphabetical = chronological)
+        # (input is already chronological, so this is a linear timsort pass)
         def sort_events(evlist):
             return sorted(evlist, key=lambda ev: ev.get('stamp', ''))
 
@@ -1566,143 +1897,159 @@ class MEMORY:
         if event_limit:
             events = events[-event_limit:]  # Most recent N
 
-        # --- Conversation/LLM-optimized format ---
-        if format == 'conversation':
-            # Only include messages and filter by include_roles
-            conv_msgs = [ev for ev in events if ev.get('role') in include_roles]
-            # Already sorted by stamp
-
-            conversation_parts = []
-            current_length = 0
-            for msg in conv_msgs:
-                role = msg.get('role', 'unknown')
-                content = msg.get('content', '')
+        # Step 2: Format with the handler for the requested output format
+        return handler(
+            events,
+            include_metadata=include_metadata,
+            pretty=pretty,
+            max_length=max_length,
+            condense_msg=condense_msg,
+            max_message_length=max_message_length,
+            max_total_length=max_total_length,
+            include_roles=include_roles,
+            message_separator=message_separator,
+            role_prefix=role_prefix,
+            truncate_indicator=truncate_indicator,
+        )
+
+    # render(format=...) → method producing that format
+    _RENDER_HANDLERS = {
+        'conversation': '_render_conversation',
+        'json'        : '_render_json',
+        'table'       : '_render_table',
+        'plain'       : '_render_lines',
+        'markdown'    : '_render_lines',
+    }
+
+    def _render_conversation(self, events, include_roles, max_message_length, max_total_length,
+                             message_separator, role_prefix, truncate_indicator, **_):
+        """Render user/assistant messages as an LLM-ready conversation string."""
+        # Only include messages and filter by include_roles
+        conv_msgs = [ev for ev in events if ev.get('role') in include_roles]
+        # Already sorted by stamp
+
+        # Fill the budget from the newest message backwards, so the most
+        # recent context is kept whole and older messages are dropped
+        conversation_parts = deque()
+        current_length = 0
+        prefixes = {'user': 'User: ', 'assistant': 'Assistant: '}
+        for msg in reversed(conv_msgs):
+            role = msg.get('role', 'unknown')
+            content = msg.get('content', '')
 
-                # Truncate individual message if needed
-                if len(content) > max_message_length:
-                    content = content[:max_message_length - len(truncate_indicator)] + truncate_indicator
+            # Truncate individual message if needed
+            if len(content) > max_message_length:
+                content = content[:max_message_length - len(truncate_indicator)] + truncate_indicator
 
-                # Format the message
-                if role_prefix:
-                    if role == 'user':
-                        formatted_msg = "User: " + content
-                    elif role == 'assistant':
-                        formatted_msg = "Assistant: " + content
-                    else:
-                        formatted_msg = role.title() + ": " + content
-                else:
-                    formatted_msg = content
-
-                # Check if adding this message would exceed total length
-                message_length = len(formatted_msg) + len(message_separator)
-                if current_length + message_length > max_total_length:
-                    # If we can't fit the full message, try to fit a truncated version
-                    remaining_space = max_total_length - current_length - len(truncate_indicator)
-                    if remaining_space > 50:  # Only add if there's reasonable space
-                        if role_prefix:
-                            prefix_len = len(role.title() + ": ")
-                            truncated_content = content[:remaining_space - prefix_len] + truncate_indicator
-                            formatted_msg = role.title() + ": " + truncated_content
-                        else:
-                            formatted_msg = content[:remaining_space] + truncate_indicator
-                        conversation_parts.append(formatted_msg)
+            # Format the message (each role's prefix is built once)
+            if role_prefix:
+                prefix = prefixes.get(role)
+                if prefix is None:
+                    prefix = prefixes[role] = role.title() + ": "
+                formatted_msg = prefix + content
+            else:
+                formatted_msg = content
+
+            # Stop at the first message that would exceed the total length,
+            # fitting a truncated version of it if there's reasonable space
+            message_length = len(formatted_msg) + len(message_separator)
+            if current_length + message_length > max_total_length:
+                remaining_space = max_total_length - current_length - len(truncate_indicator)
+                if remaining_space > 50:
+                    prefix = prefixes[role] if role_prefix else ''
+                    formatted_msg = prefix + content[:remaining_space - len(prefix)] + truncate_indicator
+                    conversation_parts.appendleft(formatted_msg)
+                break
+
+            conversation_parts.appendleft(formatted_msg)
+            current_length += message_length
+
+        return message_separator.join(conversation_parts)
+
+    def _render_json(self, events, include_metadata, pretty, max_length, **_):
+        """Render events as a JSON list of dicts."""
+        if not include_metadata:
+            # Remove metadata fields (keeping each event's key order)
+            keep = _JSON_KEEP_KEYS
+            out_events = [{k: v for k, v in ev.items() if k in keep} for ev in events]
+        else:
+            out_events = events
+        if max_length and pretty:
+            # Indented output is encoded in pure Python either way, so
+            # stream it and stop once past max_length (compact output
+            # keeps json.dumps, whose one-shot C encoder is faster).
+            parts = []
+            total_length = 0
+            for chunk in json.JSONEncoder(indent=2, default=str).iterencode(out_events):
+                parts.append(chunk)
+                total_length += len(chunk)
+                if total_length > max_length:
                     break
+            output = ''.join(parts)
+        else:
+            output = json.dumps(out_events, indent=2 if pretty else None, default=str)
+        if max_length and len(output) > max_length:
+            output = output[:max_length] + _SNIP_NOTICE
+        return output
 
-                conversation_parts.append(formatted_msg)
-                current_length += message_length
-
-            return message_separator.join(conversation_parts)
-
-        # --- JSON format ---
-        output = None
+    def _render_table(self, events, **_):
+        """Render one tab-separated row per event (max_length does not apply)."""
+        table_lines = ["Type\tContent\tDatetime\tStamp\tChannel"]
+        for ev in events:
+            typ = ev.get('type', ev.get('role', ''))
+            if typ == 'var':
+                content = f"{ev.get('var_name', '?')} = {ev.get('var_value', '?')}"
+            else:
+                content = ev.get('content', '')
+            dt = ev.get('dt_utc') or ev.get('dt_bog') or ''
+            table_lines.append(f"{typ}\t{content}\t{dt}\t{ev.get('stamp', '')}\t{ev.get('channel', '')}")
+        return "\n".join(table_lines)
+
+    def _render_lines(self, events, include_metadata, pretty, max_length, condense_msg, **_):
+        """Render one '[TYPE] content (datetime)' line per event (plain/markdown)."""
+        lines = []
         total_length = 0
-        snip_notice = " [snipped]"  # For snipped messages
-
-        if format == 'json':
-            # Output as JSON (list of dicts)
-            if not include_metadata:
-                # Remove metadata fields
-                def strip_meta(ev):
-                    return {k: v for k, v in ev.items() if k in ('role', 'content', 'type', 'channel')}
-                out_events = [strip_meta(ev) for ev in events]
+        for ev in events:
+            # Compose line based on event type
+            event_type = ev.get('type', 'msg')
+            if event_type == 'log' or ev.get('role') == 'logger':
+                prefix = "[LOG]"
+                content = ev.get('content', '')
+            elif event_type == 'ref':
+                prefix = "[REF]"
+                content = ev.get('content', '')
+            elif event_type == 'var':
+                prefix = "[VAR]"
+                content = f"{ev.get('var_name', '?')} = {ev.get('var_value', '?')}"
             else:
-                out_events = events
-            output = json.dumps(out_events, indent=2 if pretty else None, default=str)
-            if max_length and len(output) > max_length:
-                output = output[:max_length] + snip_notice
-
-        elif format in ('plain', 'markdown', 'table'):
-            # Build lines for each event
-            lines = []
-            for ev in events:
-                # Compose line based on event type
-                event_type = ev.get('type', 'msg')
-                if event_type == 'log' or ev.get('role') == 'logger':
-                    prefix = "[LOG]"
-                    content = ev.get('content', '')
-                elif event_type == 'ref':
-                    prefix = "[REF]"
-                    content = ev.get('content', '')
-                elif event_type == 'var':
-                    prefix = "[VAR]"
-                    content = "{} = {}".format(ev.get('var_name', '?'), ev.get('var_value', '?'))
-                else:
-                    prefix = "[{}]".format(ev.get('role', 'MSG').upper())
-                    content = ev.get('content', '')
-
-                # Optionally include metadata
-                meta = ""
-                if include_metadata:
-                    dt = ev.get('dt_utc') or ev.get('dt_bog')
-                    stamp = ev.get('stamp', '')
-                    channel = ev.get('channel', '')
-                    meta = " ({})".format(dt) if dt else ""
-                    if format == 'table':
-                        meta = "\t{}\t{}\t{}".format(dt or '', stamp or '', channel or '')
-
-                # Condense message if needed
-                line = "{} {}{}".format(prefix, content, meta)
-                if max_length and total_length + len(line) > max_length:
-                    if condense_msg:
-                        # Snip the content to fit
-                        allowed = max_length - total_length - len(snip_notice)
-                        if allowed > 0:
-                            line = line[:allowed] + snip_notice
-                        else:
-                            line = snip_notice
-                        lines.append(line)
-                        break
+                prefix = f"[{ev.get('role', 'MSG').upper()}]"
+                content = ev.get('content', '')
+
+            # Optionally include metadata
+            meta = ""
+            if include_metadata:
+                dt = ev.get('dt_utc') or ev.get('dt_bog')
+                meta = f" ({dt})" if dt else ""
+
+            # Condense message if needed
+            line = f"{prefix} {content}{meta}"
+            if max_length and total_length + len(line) > max_length:
+                if condense_msg:
+                    # Snip the content to fit
+                    allowed = max_length - total_length - len(_SNIP_NOTICE)
+                    if allowed > 0:
+                        line = line[:allowed] + _SNIP_NOTICE
                     else:
-                        break
-                lines.append(line)
-                total_length += len(line) + 1  # +1 for newline
-
-            # Format as table if requested
-            if format == 'table':
-                # Table header
-                header = "Type\tContent\tDatetime\tStamp\tChannel"
-                table_lines = [header]
-                for ev in events:
-                    typ = ev.get('type', ev.get('role', ''))
-                    if typ == 'var':
-                        content = "{} = {}".format(ev.get('var_name', '?'), ev.get('var_value', '?'))
-                    else:
-                        content = ev.get('content', '')
-                    dt = ev.get('dt_utc') or ev.get('dt_bog') or ''
-                    stamp = ev.get('stamp', '')
-                    channel = ev.get('channel', '')
-                    row = "{}\t{}\t{}\t{}\t{}".format(typ, content, dt, stamp, channel)
-                    table_lines.append(row)
-                output = "\n".join(table_lines)
-            else:
-                sep = "\n" if pretty else " "
-                output = sep.join(lines)
-
-        else:
-            raise ValueError("Unknown format: {}".format(format))
-
-        return output
+                        line = _SNIP_NOTICE
+                    lines.append(line)
+                    break
+                else:
+                    break
+            lines.append(line)
+            total_length += len(line) + 1  # +1 for newline
 
+        sep = "\n" if pretty else " "
+        return sep.join(lines)
 
 MemoryManipulationExamples = """
 
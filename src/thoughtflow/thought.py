@@ -7,16 +7,63 @@ workflow. It is the atomic unit of cognition in the ThoughtFlow framework.
 
 from __future__ import annotations
 
+import re
+import ast
+import copy
+import asyncio
+import contextvars
 import json
+import time
+import threading
+from collections import OrderedDict
 
 from thoughtflow._util import (
     event_stamp,
     construct_prompt,
     construct_msgs,
+    exchange_key,
     valid_extract,
     ValidExtractError,
 )
 
+# Built-in parse_response patterns, compiled once at import
+_JSON_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL | re.IGNORECASE)
+_JSON_BODY_RE = re.compile(r"(\{.*\}|\[.*\])", re.DOTALL)
+_LIST_RE = re.compile(r"(\[.*\])", re.DOTALL)
+# The repaired prompt of the retry in progress, as (thought, prompt). It is
+# context-local, so concurrent runs of one THOUGHT each see their own.
+_RETRY_PROMPT = contextvars.ContextVar("thoughtflow_retry_prompt", default=None)
+
+# construct_prompt tags every section marker with a random per-call stamp
+_PROMPT_STAMP_RE = re.compile(r"<start prompt (\w+)>")
+
+
+# Immutable leaf types that copies can share instead of deep-copying
+_ATOMIC_TYPES = frozenset({str, int, float, bool, type(None), bytes})
+
+
+def _fast_copy(obj):
+    """Deep-copy plain lists/dicts of atomic values directly; defer anything else to deepcopy."""
+    cls = type(obj)
+    if cls in _ATOMIC_TYPES:
+        return obj
+    if cls is list:
+        return [_fast_copy(v) for v in obj]
+    if cls is dict:
+        return {k: _fast_copy(v) for k, v in obj.items()}
+    return copy.deepcopy(obj)
+
+
+def _with_repair_suffix(prompt, suffix):
+    """Return a retry prompt with suffix appended (to the last section of a dict prompt)."""
+    if isinstance(prompt, str):
+        return prompt.rstrip() + suffix
+    if isinstance(prompt, dict):
+        prompt = dict(prompt)
+        last_key = next(reversed(prompt))
+        prompt[last_key] = prompt[last_key].rstrip() + suffix
+    return prompt
+
 
 class THOUGHT:
     """
@@ -94,6 +141,8 @@ class THOUGHT:
         validator (str|callable): Config-style alias for `validation`; behaves identically
         max_retries (int): Maximum retry attempts (default: 1)
         retry_delay (float): Delay between retries in seconds (default: 0)
+        history_max (int): Most recent executions kept in execution_history
+            (default: 1000; None keeps all)
         required_vars (list): Variables required from memory
         optional_vars (list): Optional variables from memory
         output_var (str): Variable name for storing result (default: '{name}_result')
@@ -102,6 +151,14 @@ class THOUGHT:
         on_token (callable): When set, the LLM response is streamed and this
             hook receives each text chunk as it arrives: fn(chunk). The full
             text still flows through parsing/validation normally.
+        cache_mode (str): 'off' (default) or 'exact'. With 'exact', responses
+            are memoized per thought by a hash of the LLM identity, the
+            messages (ignoring construct_prompt's random marker stamps) and
+            the LLM params, so re-running with identical context skips the call.
+            Only non-empty responses that pass validation are cached (under
+            the first attempt's request when a retry succeeded).
+        cache_size (int): Most recent responses kept with cache_mode='exact'
+            (default: 256)
         channel (str): Channel for message tracking (default: 'system')
         add_reflection (bool): Whether to add reflection on success (default: True)
 
@@ -199,12 +256,22 @@ class THOUGHT:
         self.last_msgs = None
         self.last_response = None
 
-        # Allow for custom hooks (pre/post processing)
+        # Allow for custom hooks (pre/post processing); the property setters
+        # drop non-callables, so __call__ only has to check for None
         self.pre_hook = kwargs.get("pre_hook", None)
         self.post_hook = kwargs.get("post_hook", None)
         
-        # Execution history tracking
+        # Execution history tracking (oldest entries dropped past history_max)
         self.execution_history = []
+        self.history_max = kwargs.get("history_max", 1000)
+
+        # Opt-in LRU response cache, keyed by a content hash of the request
+        self.cache_mode = kwargs.get("cache_mode", "off")
+        if self.cache_mode not in ("off", "exact"):
+            raise ValueError("Unknown cache_mode: {}".format(self.cache_mode))
+        self._response_cache = OrderedDict()
+        self._response_cache_size = kwargs.get("cache_size", 256)
+        self._response_cache_lock = threading.Lock()
 
 
     def __call__(self, memory, vars={}, **kwargs):
@@ -218,16 +285,14 @@ class THOUGHT:
         Returns:
             Updated MEMORY object with result stored (if applicable).
         """
-        import time as time_module
-        
-        start_time = time_module.time()
+        start_time = time.time()
         
         # Allow vars to be None
         if vars is None:
             vars = {}
         
         # Pre-hook
-        if self.pre_hook and callable(self.pre_hook):
+        if self.pre_hook is not None:
             self.pre_hook(self, memory, vars, **kwargs)
 
         # Determine operation type
@@ -246,7 +311,7 @@ class THOUGHT:
             raise ValueError("Unknown operation: {}. Valid operations: {}".format(operation, self.VALID_OPERATIONS))
         
         # Calculate execution duration
-        duration_ms = (time_module.time() - start_time) * 1000
+        duration_ms = (time.time() - start_time) * 1000
         
         # Build execution event for logging
         execution_event = {
@@ -281,13 +346,62 @@ class THOUGHT:
             'attempts': attempts_made,
             'error': self.last_error
         })
+        overflow = len(self.execution_history) - self.history_max if self.history_max is not None else 0
+        if overflow > 0:
+            del self.execution_history[:overflow]
 
         # Post-hook
-        if self.post_hook and callable(self.post_hook):
+        if self.post_hook is not None:
             self.post_hook(self, memory, self.last_result, self.last_error)
 
         return memory
 
+    @property
+    def prompt(self):
+        """Prompt template; during a retry, the repaired prompt for that run."""
+        override = _RETRY_PROMPT.get()
+        if override is not None and override[0] is self:
+            return override[1]
+        return self._prompt
+
+    @prompt.setter
+    def prompt(self, value):
+        self._prompt = value
+
+    @property
+    def pre_hook(self):
+        """Hook called before execution, or None; non-callables are stored as None."""
+        return self._pre_hook
+
+    @pre_hook.setter
+    def pre_hook(self, value):
+        self._pre_hook = value if callable(value) else None
+
+    @property
+    def post_hook(self):
+        """Hook called after execution, or None; non-callables are stored as None."""
+        return self._post_hook
+
+    @post_hook.setter
+    def post_hook(self, value):
+        self._post_hook = value if callable(value) else None
+
+    async def acall(self, memory, vars={}, **kwargs):
+        """
+        Awaitable version of calling the thought, for asyncio agent loops.
+
+        The whole execution (LLM round-trips and retry_delay sleeps) runs
+        in a worker thread, so a retrying thought never blocks the event
+        loop and independent thoughts can be gathered concurrently. Give
+        concurrently running thoughts their own MEMORY objects. The same
+        THOUGHT may run concurrently; its last_* attributes then reflect
+        whichever run wrote them last.
+
+        Returns:
+            Updated MEMORY object, as from __call__.
+        """
+        return await asyncio.to_thread(self.__call__, memory, vars, **kwargs)
+
     def _build_repair_suffix(self, why):
         """
         Build the repair suffix for retry attempts.
@@ -299,7 +413,7 @@ class THOUGHT:
         Returns:
             str: Suffix to append to the prompt for retry.
         """
-        return "\n(Please return only the requested format; your last answer failed: {})".format(why)
+        return f"\n(Please return only the requested format; your last answer failed: {why})"
 
     def _execute_llm_call(self, memory, vars, **kwargs):
         """
@@ -308,33 +422,43 @@ class THOUGHT:
         Returns:
             tuple: (result, last_error, attempts_made)
         """
-        import copy as copy_module
-        import time as time_module
-        
         retries_left = self.max_retries
         last_error = None
         result = None
         attempts_made = 0
         
-        # Store original prompt to avoid mutation - work with a copy
-        original_prompt = copy_module.deepcopy(self.prompt)
-        working_prompt = copy_module.deepcopy(self.prompt)
+        # Retries build their repaired prompt from the original (a new str,
+        # or a shallow dict copy with a new last section). It is exposed as
+        # self.prompt through a context variable rather than by reassigning
+        # the attribute, so concurrent runs of one THOUGHT (e.g. gathered
+        # acall()s) can't leak a repair suffix into each other.
+        original_prompt = self._prompt
+        working_prompt = None
+        cache_key = None
 
         while retries_left > 0:
             attempts_made += 1
             try:
-                # Temporarily set working prompt for this iteration
-                self.prompt = working_prompt
-                
-                # Build context and prompt/messages
-                ctx = self.get_context(memory)
-                ctx.update(vars)
-                msgs = self.build_msgs(memory, ctx)
-
-                # Run LLM
+                # Build context and prompt/messages (build_msgs merges
+                # get_context with vars itself)
+                token = _RETRY_PROMPT.set((self, working_prompt)) if working_prompt is not None else None
+                try:
+                    msgs = self.build_msgs(memory, vars)
+                finally:
+                    if token is not None:
+                        _RETRY_PROMPT.reset(token)
+
+                # Run LLM. With cache_mode='exact', the first attempt's
+                # request is the cache key: a hit skips the call, and only a
+                # response that passes validation is stored under it.
                 llm_kwargs = self.config.get("llm_params", {})
                 llm_kwargs.update(kwargs)
-                response = self.run_llm(msgs, **llm_kwargs)
+                response = None
+                if cache_key is None and attempts_made == 1 and self.cache_mode == "exact":
+                    cache_key = self._response_cache_key(msgs, llm_kwargs)
+                    response = self._cached_response(cache_key)
+                if response is None:
+                    response = self.run_llm(msgs, **llm_kwargs)
                 self.last_response = response
 
                 # Get channel from config for message tracking
@@ -353,6 +477,8 @@ class THOUGHT:
                 if valid:
                     result = parsed
                     self.last_error = None
+                    if cache_key is not None:
+                        self._cache_response(cache_key, response)
                     # Logging
                     if hasattr(memory, "add_log") and callable(getattr(memory, "add_log", None)):
                         memory.add_log("Thought '{}' completed successfully".format(self.name))
@@ -371,33 +497,18 @@ class THOUGHT:
                     if hasattr(memory, "add_log") and callable(getattr(memory, "add_log", None)):
                         memory.add_log("Thought '{}' validation failed: {}".format(self.name, why))
                     # Create repair suffix for next retry (modify working_prompt, not original)
-                    repair_suffix = self._build_repair_suffix(why)
-                    if isinstance(original_prompt, str):
-                        working_prompt = original_prompt.rstrip() + repair_suffix
-                    elif isinstance(original_prompt, dict):
-                        working_prompt = copy_module.deepcopy(original_prompt)
-                        last_key = list(working_prompt.keys())[-1]
-                        working_prompt[last_key] = working_prompt[last_key].rstrip() + repair_suffix
+                    working_prompt = _with_repair_suffix(original_prompt, self._build_repair_suffix(why))
             except Exception as e:
                 last_error = str(e)
                 self.last_error = last_error
                 if hasattr(memory, "add_log") and callable(getattr(memory, "add_log", None)):
                     memory.add_log("Thought '{}' error: {}".format(self.name, last_error))
                 # Create repair suffix for next retry (modify working_prompt, not original)
-                repair_suffix = self._build_repair_suffix(last_error)
-                if isinstance(original_prompt, str):
-                    working_prompt = original_prompt.rstrip() + repair_suffix
-                elif isinstance(original_prompt, dict):
-                    working_prompt = copy_module.deepcopy(original_prompt)
-                    last_key = list(working_prompt.keys())[-1]
-                    working_prompt[last_key] = working_prompt[last_key].rstrip() + repair_suffix
+                working_prompt = _with_repair_suffix(original_prompt, self._build_repair_suffix(last_error))
             retries_left -= 1
             if self.retry_delay:
-                time_module.sleep(self.retry_delay)
+                time.sleep(self.retry_delay)
 
-        # Restore original prompt after execution (prevents permanent mutation)
-        self.prompt = original_prompt
-        
         return result, last_error, attempts_made
 
     def _execute_memory_query(self, memory, vars, **kwargs):
@@ -410,27 +521,18 @@ class THOUGHT:
         """
         try:
             result = {}
+            found = self._fetch_vars(memory, list(self.required_vars) + list(self.optional_vars))
             
             # Get required variables
             for var in self.required_vars:
-                if hasattr(memory, "get_var") and callable(getattr(memory, "get_var", None)):
-                    val = memory.get_var(var)
-                else:
-                    val = getattr(memory, var, None)
-                
-                if val is None:
+                if var not in found:
                     return None, "Required variable '{}' not found in memory".format(var), 1
-                result[var] = val
+                result[var] = found[var]
             
             # Get optional variables
             for var in self.optional_vars:
-                if hasattr(memory, "get_var") and callable(getattr(memory, "get_var", None)):
-                    val = memory.get_var(var)
-                else:
-                    val = getattr(memory, var, None)
-                
-                if val is not None:
-                    result[var] = val
+                if var in found:
+                    result[var] = found[var]
             
             # Include any vars passed directly
             result.update(vars)
@@ -601,6 +703,31 @@ class THOUGHT:
         self.last_msgs = msgs_out
         return msgs_out
 
+    def _fetch_vars(self, memory, names):
+        """
+        Look up several variables from memory, skipping missing or None values.
+
+        Uses memory.get_vars (one bulk call) when available, then
+        memory.get_var per name, then plain attributes.
+
+        Args:
+            memory: MEMORY object.
+            names (list): Variable names to fetch.
+
+        Returns:
+            dict: Variable name → value for each name found.
+        """
+        get_vars = getattr(memory, "get_vars", None)
+        if callable(get_vars):
+            values = get_vars(names)
+        else:
+            get_var = getattr(memory, "get_var", None)
+            if callable(get_var):
+                values = {var: get_var(var) for var in names}
+            else:
+                values = {var: getattr(memory, var, None) for var in names}
+        return {var: val for var, val in values.items() if val is not None}
+
     def get_context(self, memory):
         """
         Extract relevant context from the MEMORY object for this thought.
@@ -611,33 +738,19 @@ class THOUGHT:
         Returns:
             dict: Context variables for prompt filling.
         """
-        ctx = {}
-        # If required_vars is specified, try to get those from memory
-        if hasattr(self, "required_vars") and self.required_vars:
-            for var in self.required_vars:
-                # Try to get from memory.get_var if available
-                if hasattr(memory, "get_var") and callable(getattr(memory, "get_var", None)):
-                    val = memory.get_var(var)
-                else:
-                    val = getattr(memory, var, None)
-                if val is not None:
-                    ctx[var] = val
-        # Optionally, add optional_vars if present in memory
-        if hasattr(self, "optional_vars") and self.optional_vars:
-            for var in self.optional_vars:
-                if hasattr(memory, "get_var") and callable(getattr(memory, "get_var", None)):
-                    val = memory.get_var(var)
-                else:
-                    val = getattr(memory, var, None)
-                if val is not None:
-                    ctx[var] = val
+        # Fetch required_vars and optional_vars present in memory in one call
+        names = list(getattr(self, "required_vars", None) or []) + list(getattr(self, "optional_vars", None) or [])
+        ctx = self._fetch_vars(memory, names) if names else {}
         # Add some common context keys if available (content_only=True for prompt templates)
-        if hasattr(memory, "last_user_msg") and callable(getattr(memory, "last_user_msg", None)):
-            ctx["last_user_msg"] = memory.last_user_msg(content_only=True)
-        if hasattr(memory, "last_asst_msg") and callable(getattr(memory, "last_asst_msg", None)):
-            ctx["last_asst_msg"] = memory.last_asst_msg(content_only=True)
-        if hasattr(memory, "get_msgs") and callable(getattr(memory, "get_msgs", None)):
-            ctx["messages"] = memory.get_msgs(repr="list")
+        last_user_msg = getattr(memory, "last_user_msg", None)
+        if callable(last_user_msg):
+            ctx["last_user_msg"] = last_user_msg(content_only=True)
+        last_asst_msg = getattr(memory, "last_asst_msg", None)
+        if callable(last_asst_msg):
+            ctx["last_asst_msg"] = last_asst_msg(content_only=True)
+        get_msgs = getattr(memory, "get_msgs", None)
+        if callable(get_msgs):
+            ctx["messages"] = get_msgs(repr="list")
         # Add all memory.vars if present
         if hasattr(memory, "vars"):
             ctx.update(getattr(memory, "vars", {}))
@@ -698,6 +811,54 @@ class THOUGHT:
         
         return response
 
+    def _cached_response(self, key):
+        """Return the response cached under key (cache_mode='exact'), or None."""
+        with self._response_cache_lock:
+            if key in self._response_cache:
+                self._response_cache.move_to_end(key)
+                return self._response_cache[key]
+        return None
+
+    def _cache_response(self, key, response):
+        """Cache a validated, non-empty response under key, evicting the oldest."""
+        if not response:
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = response
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self._response_cache_size:
+                self._response_cache.popitem(last=False)
+
+    def _response_cache_key(self, msgs, llm_kwargs):
+        """
+        Content hash of an LLM request for cache_mode='exact'.
+
+        Messages are reduced to role and content, with construct_prompt's
+        random marker stamp removed, so identical context gives the same key.
+        The LLM's service, model and default params are part of the key.
+        """
+        canonical = []
+        for m in msgs:
+            if isinstance(m, dict):
+                content = m.get("content", "")
+                match = _PROMPT_STAMP_RE.search(content) if isinstance(content, str) else None
+                if match:
+                    content = content.replace(" {}>".format(match.group(1)), ">")
+                canonical.append({"role": m.get("role", "user"), "content": content})
+            else:
+                canonical.append(m)
+        llm = self.llm
+        return exchange_key(
+            getattr(llm, "service", type(llm).__name__),
+            getattr(llm, "model", None),
+            {"messages": canonical, "params": llm_kwargs, "defaults": getattr(llm, "default_params", None)},
+        )
+
+    def clear_cache(self):
+        """Drop responses memoized via cache_mode='exact'."""
+        with self._response_cache_lock:
+            self._response_cache.clear()
+
     def parse_response(self, response):
         """
         Parse the LLM response to extract the desired content.
@@ -733,27 +894,21 @@ class THOUGHT:
         if parser == "text":
             return response
         elif parser == "json":
-            import re
             # Remove wrapping markdown code fences if present
             text = response.strip()
-            fence_match = re.match(
-                r"^\s*```(?:json)?\s*\n?(.*?)\n?\s*```\s*$",
-                text,
-                flags=re.DOTALL | re.IGNORECASE,
-            )
+            fence_match = _JSON_FENCE_RE.match(text)
             if fence_match:
                 text = fence_match.group(1).strip()
             # Find first JSON object or array
-            match = re.search(r"(\{.*\}|\[.*\])", text, re.DOTALL)
+            match = _JSON_BODY_RE.search(text)
             if match:
                 json_str = match.group(1)
                 return json.loads(json_str)
             else:
                 raise ValueError("No JSON object or array found in response.")
         elif parser == "list":
-            import ast, re
             # Find first list literal
-            match = re.search(r"(\[.*\])", response, re.DOTALL)
+            match = _LIST_RE.search(response)
             if match:
                 list_str = match.group(1)
                 return ast.literal_eval(list_str)
@@ -837,9 +992,10 @@ class THOUGHT:
             MEMORY: Updated memory object.
         """
         # Store result in vars or via set_var if available
-        varname = self.output_var or ("{}_result".format(self.name) if self.name else "thought_result")
-        if hasattr(memory, "set_var") and callable(getattr(memory, "set_var", None)):
-            memory.set_var(varname, result, desc="Result of thought: {}".format(self.name))
+        varname = self.output_var or (f"{self.name}_result" if self.name else "thought_result")
+        set_var = getattr(memory, "set_var", None)
+        if callable(set_var):
+            set_var(varname, result, desc=f"Result of thought: {self.name}")
         elif hasattr(memory, "vars"):
             # Fallback: directly access vars dict if set_var not available
             if varname not in memory.vars:
@@ -938,33 +1094,32 @@ class THOUGHT:
         Returns:
             THOUGHT: A new THOUGHT instance with copied attributes.
         """
-        import copy as copy_module
         
         new_thought = THOUGHT(
             name=self.name,
             llm=self.llm,  # Shallow copy - same LLM instance
-            prompt=copy_module.deepcopy(self.prompt),
+            prompt=_fast_copy(self.prompt),
             operation=self.operation,
             description=self.description,
             max_retries=self.max_retries,
             retry_delay=self.retry_delay,
             output_var=self.output_var,
-            required_vars=copy_module.deepcopy(self.required_vars),
-            optional_vars=copy_module.deepcopy(self.optional_vars),
+            required_vars=_fast_copy(self.required_vars),
+            optional_vars=_fast_copy(self.optional_vars),
             parse_fn=self.parse_fn,
             validation=self.validation,
             pre_hook=self.pre_hook,
             post_hook=self.post_hook,
-            **copy_module.deepcopy(self.config)
+            **copy.deepcopy(self.config)
         )
         
         # Copy internal state
         new_thought.id = event_stamp()  # Generate new ID for the copy
-        new_thought.execution_history = copy_module.deepcopy(self.execution_history)
-        new_thought.last_result = copy_module.deepcopy(self.last_result)
+        new_thought.execution_history = _fast_copy(self.execution_history)
+        new_thought.last_result = _fast_copy(self.last_result)
         new_thought.last_error = self.last_error
         new_thought.last_prompt = self.last_prompt
-        new_thought.last_msgs = copy_module.deepcopy(self.last_msgs)
+        new_thought.last_msgs = _fast_copy(self.last_msgs)
         new_thought.last_response = self.last_response
         
         return new_thought
@@ -14,6 +14,7 @@ These tests mock the HTTP layer to test the class logic without making real API
 from __future__ import annotations
 
 import json
+import pytest
 from unittest.mock import patch
 
 
@@ -268,6 +269,27 @@ class TestMessageNormalization:
         assert len(msgs) == 2
         assert all(m['role'] == 'user' for m in msgs)
 
+    def test_strips_extra_keys_from_message_dicts(self):
+        """
+        Only 'role' and 'content' may reach the provider payload.
+        
+        MEMORY message events carry extra keys (stamp, channel, ...);
+        the pre-normalized fast path must not let those through.
+        
+        Remove this test if: We start forwarding extra message fields.
+        """
+        llm = LLM(model_id="openai:gpt-4o", key="test-key")
+        
+        clean = [{'role': 'user', 'content': 'Hi'}]
+        msgs = llm._normalize_messages(clean)
+        assert msgs == clean
+        assert msgs is not clean
+        
+        msgs = llm._normalize_messages(
+            [{'role': 'user', 'content': 'Hi', 'stamp': 'ABC'}]
+        )
+        assert msgs == [{'role': 'user', 'content': 'Hi'}]
+
 
 # ============================================================================
 # Provider Routing Tests
@@ -336,6 +358,24 @@ class TestProviderRouting:
         llm = LLM(model_id="openrouter:openai/gpt-4o", key="test-key")
         assert llm.service == "openrouter"
 
+    def test_call_dispatches_through_provider_table(self):
+        """
+        call() must route via _PROVIDER_METHODS, so subclasses can add providers.
+        
+        Unknown services must still raise ValueError.
+        
+        Remove this test if: We change provider dispatch.
+        """
+        class CustomLLM(LLM):
+            _PROVIDER_METHODS = {**LLM._PROVIDER_METHODS, 'custom': '_call_custom'}
+
+            def _call_custom(self, msg_list, params):
+                return ["custom:" + self._normalize_messages(msg_list)[-1]["content"]]
+
+        assert CustomLLM("custom:model", key="k").call(["hi"]) == ["custom:hi"]
+        with pytest.raises(ValueError, match="Unsupported service"):
+            LLM("nowhere:model", key="k").call(["hi"])
+
 
 # ============================================================================
 # Call Method Tests (Mocked HTTP)
@@ -439,6 +479,28 @@ class TestLLMCall:
         assert 'Authorization' in request.headers
         assert 'sk-test-123' in request.headers['Authorization']
 
+    @patch('urllib.request.urlopen')
+    def test_auth_header_follows_reassigned_api_key(self, mock_urlopen):
+        """
+        Cached headers must be rebuilt when api_key is reassigned.
+        
+        Header dicts are built once per key; rotating the key on a live
+        instance must not keep sending the old one.
+        
+        Remove this test if: We make api_key read-only.
+        """
+        mock_urlopen.return_value = MockHTTPResponse({
+            'choices': [{'message': {'content': 'Response'}}]
+        })
+        
+        llm = LLM(model_id="openai:gpt-4o", key="sk-old")
+        llm.call(["Hello"])
+        llm.api_key = "sk-new"
+        llm.call(["Hello"])
+        
+        request = mock_urlopen.call_args[0][0]
+        assert request.headers['Authorization'] == 'Bearer sk-new'
+
     @patch('urllib.request.urlopen')
     def test_call_passes_params_to_api(self, mock_urlopen):
         """
@@ -745,6 +807,27 @@ class TestRoleMapping:
         assert original[0]["role"] == "action"
         assert mapped[0]["role"] == "tool"
 
+    def test_map_roles_shares_untranslated_messages(self):
+        """
+        _map_roles() must only copy messages whose role actually changes.
+
+        Long histories are re-prepared on every turn; untranslated
+        messages are reused rather than rebuilt.
+
+        Alter this test if: downstream code starts mutating prepared messages.
+        """
+        llm = LLM(model_id="openai:gpt-4o", key="test-key")
+        original = [
+            {"role": "user", "content": "hi"},
+            {"role": "result", "content": "tool output"},
+        ]
+
+        mapped = llm._map_roles(original)
+
+        assert mapped[0] is original[0]
+        assert mapped[1] is not original[1]
+        assert mapped[1]["role"] == "tool"
+
     def test_prepare_messages_pipelines_normalize_and_map(self):
         """
         _prepare_messages() must normalise structure then translate roles.
@@ -978,3 +1061,480 @@ class TestOpenAICompatibleLLM:
 
         request = mock_urlopen.call_args[0][0]
         assert request.full_url == "http://127.0.0.1:8765/v1/chat/completions"
+
+
+# ============================================================================
+# Keep-Alive Connection Pool Tests
+# ============================================================================
+
+
+class TestKeepAlive:
+    """
+    Tests for LLM(keep_alive=True), which reuses pooled connections.
+
+    A local HTTP/1.1 server counts distinct client connections so the
+    tests can observe reuse without touching the network.
+    """
+
+    def _serve(self, body, status=200):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        peers = set()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                peers.add(self.client_address)
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, peers
+
+    def test_reuses_one_connection_across_calls(self):
+        """
+        Sequential calls with keep_alive=True must share one connection.
+        
+        Remove this test if: We remove the keep_alive option.
+        """
+        server, peers = self._serve({"choices": [{"message": {"content": "ok"}}]})
+        try:
+            llm = OpenAICompatibleLLM(
+                model="m",
+                base_url="http://127.0.0.1:{}/v1".format(server.server_address[1]),
+                keep_alive=True,
+            )
+            for _ in range(3):
+                assert llm.call(["Hi"]) == ["ok"]
+            llm.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert len(peers) == 1
+        assert 'keep_alive' not in llm.default_params
+
+    def test_instances_share_the_process_pool(self):
+        """
+        Separate keep_alive LLMs must reuse the same pooled connection.
+        
+        Flows often build one LLM per THOUGHT; the shared pool keeps the
+        connection alive across those instances.
+        
+        Remove this test if: We make pools per-instance only.
+        """
+        server, peers = self._serve({"choices": [{"message": {"content": "ok"}}]})
+        base_url = "http://127.0.0.1:{}/v1".format(server.server_address[1])
+        try:
+            for _ in range(3):
+                llm = OpenAICompatibleLLM(model="m", base_url=base_url, keep_alive=True)
+                assert llm.call(["Hi"]) == ["ok"]
+            llm.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert len(peers) == 1
+
+    def test_proxied_requests_bypass_the_pool(self, monkeypatch):
+        """
+        keep_alive must not skip an HTTP_PROXY that applies to the URL.
+        
+        The pool connects straight to the host, so proxied requests go
+        through urllib instead. The target host does not resolve; the call
+        only succeeds if it reached the local server acting as the proxy.
+        
+        Remove this test if: The pool learns to tunnel through proxies.
+        """
+        import urllib.request
+        server, peers = self._serve({"choices": [{"message": {"content": "ok"}}]})
+        # urlopen caches its opener (and the proxy env it read); start fresh
+        # and restore afterwards so the test proxy does not leak.
+        monkeypatch.setattr(urllib.request, "_opener", None)
+        for var in ("no_proxy", "NO_PROXY", "http_proxy"):
+            monkeypatch.delenv(var, raising=False)
+        monkeypatch.setenv("HTTP_PROXY", "http://127.0.0.1:{}".format(server.server_address[1]))
+        try:
+            llm = OpenAICompatibleLLM(
+                model="m", base_url="http://thoughtflow-test.invalid/v1", keep_alive=True,
+            )
+            assert llm.call(["Hi"]) == ["ok"]
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert len(peers) == 1
+
+    def test_ollama_streams_reuse_one_connection(self):
+        """
+        Streamed Ollama calls with keep_alive must reuse one connection.
+        
+        Local agent loops stream many short replies; each finished stream
+        hands its connection back to the pool.
+        
+        Remove this test if: We stop pooling streamed requests.
+        """
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from thoughtflow._connpool import ConnectionPool
+
+        peers = set()
+        lines = [{"message": {"content": "Hel"}}, {"message": {"content": "lo"}, "done": True}]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                peers.add(self.client_address)
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                data = "".join(json.dumps(l) + "\n" for l in lines).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = ConnectionPool()
+        try:
+            llm = LLM(
+                "ollama:llama3", key="", keep_alive=pool,
+                ollama_url="http://127.0.0.1:{}".format(server.server_address[1]),
+            )
+            for _ in range(3):
+                assert "".join(llm.call(["Hi"], stream=True)) == "Hello"
+            pool.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert len(peers) == 1
+
+    def _serve_raw(self, respond):
+        """Serve POSTs with respond(handler, n), n counting requests from 1."""
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        count = [0]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                count[0] += 1
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                respond(self, count[0])
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, count
+
+    def test_pool_replaces_connection_closed_while_idle(self):
+        """
+        A pooled connection the server closed while idle must be replaced.
+        
+        The drop is detected before sending, so nothing is re-sent.
+        
+        Remove this test if: We remove the connection pool.
+        """
+        import time
+        from thoughtflow._connpool import ConnectionPool
+
+        def respond(handler, n):
+            handler.send_response(200)
+            handler.send_header("Content-Length", "2")
+            handler.end_headers()
+            handler.wfile.write(b"ok")
+            handler.close_connection = True  # close without telling the client
+
+        server, count = self._serve_raw(respond)
+        url = "http://127.0.0.1:{}/".format(server.server_address[1])
+        pool = ConnectionPool()
+        try:
+            assert pool.request("POST", url, body=b"{}") == (200, b"ok")
+            time.sleep(0.05)
+            assert pool.request("POST", url, body=b"{}") == (200, b"ok")
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+
+        assert count[0] == 2
+
+    def test_pool_does_not_resend_after_a_bad_response(self):
+        """
+        A reused connection that returns a garbled response must not retry.
+        
+        The server may already have run the (non-idempotent) POST.
+        
+        Remove this test if: We remove the connection pool.
+        """
+        import http.client
+        from thoughtflow._connpool import ConnectionPool
+
+        def respond(handler, n):
+            if n == 1:
+                handler.send_response(200)
+                handler.send_header("Content-Length", "2")
+                handler.end_headers()
+                handler.wfile.write(b"ok")
+            else:
+                handler.wfile.write(b"garbage\r\n")
+                handler.close_connection = True
+
+        server, count = self._serve_raw(respond)
+        url = "http://127.0.0.1:{}/".format(server.server_address[1])
+        pool = ConnectionPool()
+        try:
+            assert pool.request("POST", url, body=b"{}") == (200, b"ok")
+            with pytest.raises(http.client.HTTPException):
+                pool.request("POST", url, body=b"{}")
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+
+        assert count[0] == 2
+
+    def test_http_errors_return_error_dict(self):
+        """
+        Pooled HTTP errors must surface the same way as the urllib path.
+        
+        Remove this test if: We change error handling in _send_request.
+        """
+        server, _ = self._serve({"message": "bad key"}, status=401)
+        try:
+            llm = LLM(model_id="openai:m", key="k", keep_alive=True)
+            url = "http://127.0.0.1:{}/v1/chat/completions".format(server.server_address[1])
+            res = llm._send_request(url, b"{}", {"Content-Type": "application/json"})
+            llm.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert res == {"error": {"message": "bad key"}}
+
+    @pytest.mark.parametrize("keep_alive", [False, True])
+    def test_non_json_http_errors_return_error_dict(self, keep_alive):
+        """
+        A non-JSON error body (e.g. a proxy's HTML 502) must come back as
+        the same error dict from the urllib and pooled paths.
+        
+        Remove this test if: We change error handling in _send_request.
+        """
+        def respond(handler, n):
+            body = b"<html>Bad Gateway</html>"
+            handler.send_response(502)
+            handler.send_header("Content-Type", "text/html")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, _ = self._serve_raw(respond)
+        try:
+            llm = LLM(model_id="openai:m", key="k", keep_alive=keep_alive)
+            url = "http://127.0.0.1:{}/v1/chat/completions".format(server.server_address[1])
+            res = llm._send_request(url, b"{}", {"Content-Type": "application/json"})
+            llm.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert res == {"error": "<html>Bad Gateway</html>"}
+
+
+# ============================================================================
+# Streaming Line Reader Tests
+# ============================================================================
+
+
+class TestIterLines:
+    """
+    Tests for LLM._iter_lines, the chunked reader behind stream=True.
+    """
+
+    class _ChunkedResponse:
+        def __init__(self, chunks):
+            self._chunks = list(chunks)
+
+        def read(self, n):
+            return self._chunks.pop(0) if self._chunks else b""
+
+    def test_multibyte_character_split_across_reads(self):
+        """
+        A UTF-8 character split across two reads must decode intact.
+        
+        Remove this test if: We stop reading streams in fixed-size chunks.
+        """
+        encoded = 'data: {"x": "café"}\n\n'.encode("utf-8")
+        cut = encoded.index(b"\xc3") + 1
+        llm = LLM(model_id="openai:gpt-4o", key="k")
+        
+        lines = list(llm._iter_lines(self._ChunkedResponse([encoded[:cut], encoded[cut:]])))
+        
+        assert lines == ['data: {"x": "café"}', '']
+
+    def test_yields_trailing_partial_line(self):
+        """
+        Data after the last newline must still be yielded at EOF.
+        
+        Remove this test if: We change end-of-stream handling.
+        """
+        llm = LLM(model_id="openai:gpt-4o", key="k")
+        
+        lines = list(llm._iter_lines(self._ChunkedResponse([b"a\nb", b"c"])))
+        
+        assert lines == ["a", "bc"]
+
+
+# ============================================================================
+# Async Call Tests
+# ============================================================================
+
+
+class TestAsyncCalls:
+    """
+    Tests for LLM.acall / LLM.acall_many.
+    """
+
+    @patch('urllib.request.urlopen')
+    def test_acall_returns_choices(self, mock_urlopen):
+        """
+        acall must return the same choices as call.
+        
+        Remove this test if: We remove the async API.
+        """
+        import asyncio
+        mock_urlopen.return_value = MockHTTPResponse(
+            {"choices": [{"message": {"content": "async ok"}}]}
+        )
+        llm = LLM(model_id="openai:gpt-4o", key="k")
+        
+        assert asyncio.run(llm.acall(["Hi"])) == ["async ok"]
+
+    def test_acall_many_preserves_order(self):
+        """
+        acall_many must return results in request order, not finish order.
+        
+        Remove this test if: We remove the async API.
+        """
+        import asyncio
+        import time
+
+        class SlowEchoLLM(LLM):
+            def call(self, msg_list, params={}, output_schema=None, stream=False):
+                text = msg_list[0]
+                time.sleep(0.05 if text == "first" else 0.0)
+                return [text]
+
+        llm = SlowEchoLLM(model_id="openai:gpt-4o", key="k")
+        
+        results = asyncio.run(llm.acall_many([["first"], ["second"], ["third"]]))
+        
+        assert results == [["first"], ["second"], ["third"]]
+
+    def test_batch_call_runs_concurrently_in_order(self):
+        """
+        batch_call must overlap requests and keep results in request order.
+        
+        Remove this test if: We remove batch_call.
+        """
+        import threading
+
+        # Every call waits until all four are in flight; run one at a time,
+        # the first call would time out and break the barrier.
+        barrier = threading.Barrier(4, timeout=5)
+
+        class BarrierLLM(LLM):
+            def call(self, msg_list, params={}, output_schema=None, stream=False):
+                barrier.wait()
+                return [msg_list[0]]
+
+        llm = BarrierLLM(model_id="openai:gpt-4o", key="k")
+        
+        results = llm.batch_call([["a"], ["b"], ["c"], ["d"]])
+        
+        assert results == [["a"], ["b"], ["c"], ["d"]]
+        assert llm.batch_call([]) == []
+
+
+# ============================================================================
+# Response Cache Tests
+# ============================================================================
+
+
+class TestResponseCache:
+    """
+    Tests for LLM(response_cache=N), the deterministic-request LRU.
+    """
+
+    def _response(self, text):
+        return MockHTTPResponse({"choices": [{"message": {"content": text}}]})
+
+    @patch('urllib.request.urlopen')
+    def test_deterministic_repeat_is_served_from_cache(self, mock_urlopen):
+        """
+        A repeated temperature=0 request must not hit the network again.
+        
+        Remove this test if: We remove response_cache.
+        """
+        mock_urlopen.return_value = self._response("cached")
+        llm = LLM(model_id="openai:gpt-4o", key="k", response_cache=8, temperature=0)
+        
+        assert llm.call(["Hi"]) == ["cached"]
+        assert llm.call(["Hi"]) == ["cached"]
+        assert mock_urlopen.call_count == 1
+        
+        llm.clear_cache()
+        llm.call(["Hi"])
+        assert mock_urlopen.call_count == 2
+
+    @patch('urllib.request.urlopen')
+    def test_sampled_requests_are_not_cached(self, mock_urlopen):
+        """
+        Requests with non-zero temperature and no seed must always be sent.
+        
+        Remove this test if: We remove response_cache.
+        """
+        mock_urlopen.return_value = self._response("fresh")
+        llm = LLM(model_id="openai:gpt-4o", key="k", response_cache=8)
+        
+        llm.call(["Hi"], params={"temperature": 0.7})
+        llm.call(["Hi"], params={"temperature": 0.7})
+        
+        assert mock_urlopen.call_count == 2
+        assert 'response_cache' not in llm.default_params
+
+    @patch('urllib.request.urlopen')
+    def test_cache_evicts_least_recently_used(self, mock_urlopen):
+        """
+        The cache must stay within its configured size.
+        
+        Remove this test if: We remove response_cache.
+        """
+        mock_urlopen.return_value = self._response("x")
+        llm = LLM(model_id="openai:gpt-4o", key="k", response_cache=2, seed=1)
+        
+        for prompt in ["a", "b", "c"]:
+            llm.call([prompt])
+        llm.call(["a"])
+        
+        assert mock_urlopen.call_count == 4
@@ -61,6 +61,31 @@ class TestMemoryInitialization:
         assert len(mem.idx_refs) == 0
         assert len(mem.idx_all) == 0
 
+    def test_type_indexes_are_views_of_master_index(self):
+        """
+        idx_msgs/idx_logs/idx_refs/idx_vars must be derived from idx_all.
+        
+        Only idx_all is maintained on insert; the per-type views must still
+        reflect every new event and keep chronological order.
+        
+        Remove this test if: We drop the per-type index views.
+        """
+        mem = MEMORY()
+        mem.add_msg('user', 'Hi', channel='webapp')
+        mem.add_log('Log entry')
+        assert len(mem.idx_msgs) == 1
+        
+        mem.add_msg('assistant', 'Hello', channel='webapp')
+        mem.set_var('x', 1)
+        
+        assert [p[1] for p in mem.idx_msgs] == [
+            p[1] for p in mem.idx_all if mem.events[p[1]]['type'] == 'msg'
+        ]
+        assert len(mem.idx_msgs) == 2
+        assert len(mem.idx_logs) == 1
+        assert len(mem.idx_vars) == 1
+        assert len(mem.idx_all) == 4
+
     def test_has_valid_roles_set(self):
         """
         MEMORY must have a set of valid message roles defined.
@@ -98,6 +123,24 @@ class TestMessageOperations:
     Tests for message-related MEMORY operations.
     """
 
+    def test_event_timestamps_share_one_instant(self, memory):
+        """
+        dt_bog and dt_utc must be millisecond strings for the same instant.
+        
+        Both are derived from one clock read; Bogota is UTC-5 year-round.
+        
+        Remove this test if: We change the timestamp format or timezones.
+        """
+        import datetime as dtt
+        memory.add_msg('user', 'Hello', channel='webapp')
+        ev = memory.get_msgs()[0]
+        
+        fmt = '%Y-%m-%d %H:%M:%S.%f'
+        bog = dtt.datetime.strptime(ev['dt_bog'], fmt)
+        utc = dtt.datetime.strptime(ev['dt_utc'], fmt)
+        assert len(ev['dt_utc']) == 23
+        assert utc - bog == dtt.timedelta(hours=5)
+
     def test_add_msg_stores_message(self, memory):
         """
         add_msg must store a message that can be retrieved.
@@ -302,6 +345,30 @@ class TestMessageOperations:
         """
         assert memory.last_user_msg(content_only=True) == ''
 
+    def test_last_msg_tracks_new_and_reloaded_events(self, memory):
+        """
+        last_*_msg must follow new messages, including after a miss and a reload.
+        
+        The newest stamp per role is cached, so it must stay correct as
+        events are added and when a memory is rebuilt from JSON.
+        
+        Remove this test if: We change last_*_msg semantics.
+        """
+        assert memory.last_user_msg() is None
+        memory.add_msg('user', 'First', channel='webapp')
+        memory.add_msg('assistant', 'Reply', channel='webapp')
+        memory.add_log('Noise')
+        assert memory.last_user_msg(content_only=True) == 'First'
+        
+        memory.add_msg('user', 'Second', channel='webapp')
+        assert memory.last_user_msg(content_only=True) == 'Second'
+        assert memory.last_log_msg(content_only=True) == 'Noise'
+        
+        restored = MEMORY.from_json(memory.to_json())
+        assert restored.last_user_msg(content_only=True) == 'Second'
+        assert restored.last_asst_msg(content_only=True) == 'Reply'
+        assert restored.last_sys_msg() is None
+
 
 class TestResultMessageOperations:
     """Tests for result-role message accessors."""
@@ -762,6 +829,21 @@ class TestVariableOperations:
         
         assert all_vars == {'a': 1, 'c': 3}
 
+    def test_get_vars_returns_requested_current_values(self, memory):
+        """
+        get_vars must return current values for the requested names only.
+        
+        THOUGHT fetches its required/optional vars with one bulk call.
+        
+        Remove this test if: We remove this convenience method.
+        """
+        memory.set_var('a', 1)
+        memory.set_var('b', 2)
+        memory.set_var('c', 3)
+        memory.del_var('b')
+        
+        assert memory.get_vars(['a', 'b', 'missing']) == {'a': 1}
+
     def test_set_var_with_description(self, memory):
         """
         set_var must store descriptions separately from values.
@@ -825,6 +907,23 @@ class TestVariableOperations:
         assert '_obj_ref' in raw_value
 
 
+    def test_nonfinite_floats_are_sized_by_their_json(self, memory):
+        """
+        Non-finite floats must be sized by their JSON form, not repr().
+        
+        repr(inf) is 'inf' but JSON writes 'Infinity', so a small
+        object_threshold must still convert them to objects.
+        
+        Remove this test if: We stop sizing scalars by repr().
+        """
+        memory.object_threshold = 5
+        memory.set_var('small', 1.5)
+        memory.set_var('inf', float('inf'))
+        
+        assert memory.get_var('small', resolve_refs=False) == 1.5
+        assert '_obj_ref' in memory.get_var('inf', resolve_refs=False)
+        assert memory.get_var('inf') == float('inf')
+
 # ============================================================================
 # Object Storage Tests
 # ============================================================================
@@ -838,6 +937,26 @@ class TestObjectStorage:
     bloat the event stream.
     """
 
+    def test_get_var_head_tail_matches_full_value(self, memory):
+        """
+        get_var_head_tail must return the same slices as the full value.
+        
+        Large vars are stored as compressed objects; their head and tail are
+        read without materializing the whole value.
+        
+        Remove this test if: We remove get_var_head_tail.
+        """
+        text = "é" + "lorem ipsum " * 2000 + "ü end"
+        memory.set_var('doc', text)
+        memory.set_var('blob', b"\x01" * 20000 + b"tail")
+        memory.set_var('small', 'short')
+        assert '_obj_ref' in memory.get_var('doc', resolve_refs=False)
+        
+        assert memory.get_var_head_tail('doc', 50, 30) == (text[:50], text[-30:])
+        assert memory.get_var_head_tail('blob', 3, 4) == (b"\x01" * 3, b"tail")
+        assert memory.get_var_head_tail('small', 2, 2) == ('sh', 'rt')
+        assert memory.get_var_head_tail('missing') is None
+
     def test_set_obj_returns_stamp(self, memory):
         """
         set_obj must return the stamp of the stored object.
@@ -952,6 +1071,20 @@ class TestSerialization:
         assert 'objects' in snapshot
         assert len(snapshot['events']) > 0
 
+    def test_snapshot_is_detached_from_memory(self, memory):
+        """
+        A snapshot must not change when events are added afterwards.
+        
+        Callers sync or diff snapshots taken at a point in time.
+        
+        Remove this test if: We make snapshot() return live views.
+        """
+        memory.add_msg('user', 'First', channel='webapp')
+        snap = memory.snapshot()
+        memory.add_msg('user', 'Second', channel='webapp')
+        
+        assert len(snap['events']) == 1
+
     def test_from_events_rehydrates_messages(self, memory):
         """
         from_events must restore messages from event list.
@@ -1003,6 +1136,24 @@ class TestSerialization:
         
         assert restored.id == original_id
 
+    def test_from_json_shares_repeated_field_strings(self, memory):
+        """
+        Reloaded events must share one string object per role/type value.
+        
+        Interning the low-cardinality fields keeps large reloaded memories
+        from holding a separate copy of 'user', 'msg', ... per event.
+        
+        Remove this test if: We change the in-memory event representation.
+        """
+        memory.add_msg('user', 'One', channel='webapp')
+        memory.add_msg('user', 'Two', channel='webapp')
+        
+        first, second = MEMORY.from_json(memory.to_json()).get_msgs()
+        
+        assert first['role'] is second['role']
+        assert first['type'] is second['type']
+        assert first['channel'] is second['channel']
+
     def test_to_json_creates_valid_json(self, populated_memory):
         """
         to_json must create valid JSON string.
@@ -1035,6 +1186,44 @@ class TestSerialization:
         assert restored.last_user_msg(content_only=True) == 'Test message'
         assert restored.get_var('name') == 'Alice'
 
+    def test_from_json_roundtrip_keeps_nonfinite_floats(self, memory):
+        """
+        NaN and ±Infinity values must survive to_json + from_json.
+        
+        The optional orjson fast path writes them as null, so documents
+        holding them must go through stdlib json.
+        
+        Remove this test if: We stop accepting non-finite floats in vars.
+        """
+        memory.set_var('x', float('nan'))
+        memory.set_var('y', [1.5, float('inf')])
+        
+        restored = MEMORY.from_json(memory.to_json())
+        
+        assert restored.get_var('x') != restored.get_var('x')
+        assert restored.get_var('y') == [1.5, float('inf')]
+
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_to_json_rejects_non_json_values(self, memory, monkeypatch, use_orjson):
+        """
+        to_json must raise TypeError for a datetime var, with or without orjson.
+        
+        orjson would write it as a string that from_json cannot turn back
+        into a datetime, so the optional extra must not change the outcome.
+        
+        Remove this test if: to_json learns to encode datetimes.
+        """
+        import datetime
+        from thoughtflow import _util
+        if use_orjson and _util._orjson is None:
+            pytest.skip('orjson not installed')
+        if not use_orjson:
+            monkeypatch.setattr(_util, '_orjson', None)
+        memory.set_var('when', datetime.datetime(2024, 1, 1))
+        
+        with pytest.raises(TypeError):
+            memory.to_json()
+
     def test_save_load_roundtrip(self, memory, temp_file):
         """
         save + load must roundtrip memory state via file.
@@ -1054,6 +1243,37 @@ class TestSerialization:
         assert restored.last_user_msg(content_only=True) == 'Hello'
         assert restored.get_var('counter') == 42
 
+    @pytest.mark.parametrize('codec', ['gzip', 'zstd'])
+    def test_compressed_save_load_roundtrip(self, memory, temp_file, codec):
+        """
+        save(compressed=True) must roundtrip with either codec.
+
+        load(compressed=True) detects the codec from the file header.
+
+        Remove this test if: We remove compressed file persistence.
+        """
+        if codec == 'zstd':
+            pytest.importorskip('zstandard')
+        memory.add_msg('user', 'Hello', channel='webapp')
+        memory.set_var('big', 'x' * 50000)
+
+        memory.save(str(temp_file), compressed=True, codec=codec)
+
+        restored = MEMORY()
+        restored.load(str(temp_file), compressed=True)
+
+        assert restored.last_user_msg(content_only=True) == 'Hello'
+        assert restored.get_var('big') == 'x' * 50000
+
+    def test_save_rejects_unknown_codec(self, memory, temp_file):
+        """
+        save must reject compression codecs it cannot read back.
+
+        Remove this test if: We accept arbitrary codecs.
+        """
+        with pytest.raises(ValueError, match='Unknown codec'):
+            memory.save(str(temp_file), compressed=True, codec='lz4')
+
     def test_copy_creates_independent_instance(self, memory):
         """
         copy must create a deep copy that is independent.
@@ -1188,6 +1408,43 @@ class TestPrepareContext:
             assert 'role' in msg
             assert 'content' in msg
 
+    def test_openai_format_tracks_messages_added_between_calls(self, memory):
+        """
+        Repeated prepare_context calls must see messages added in between.
+
+        The per-role message cache is extended as events are stored, and it
+        must not leak truncation into later calls or into other role sets.
+
+        Remove this test if: We remove OpenAI format support.
+        """
+        memory.add_msg('user', 'x' * 2000, channel='webapp')
+        first = memory.prepare_context(recent_count=1, truncate_threshold=100, format='openai')
+        assert first == [{'role': 'user', 'content': 'x' * 2000}]
+
+        memory.add_msg('assistant', 'Reply', channel='webapp')
+        memory.add_msg('system', 'Not in the default roles', channel='webapp')
+        second = memory.prepare_context(recent_count=1, truncate_threshold=100, format='openai')
+
+        assert [m['role'] for m in second] == ['user', 'assistant']
+        assert 'TRUNCATED' in second[0]['content']
+        assert memory.prepare_context(recent_count=5, format='openai')[0]['content'] == 'x' * 2000
+        all_roles = memory.prepare_context(include_roles=('user', 'assistant', 'system'), format='openai')
+        assert len(all_roles) == 3
+
+    def test_openai_format_returns_fresh_dicts(self, memory):
+        """
+        Editing a returned message must not change later prepare_context results.
+
+        Callers commonly append to or rewrite the context before sending it.
+
+        Remove this test if: We remove OpenAI format support.
+        """
+        memory.add_msg('user', 'hi', channel='webapp')
+        context = memory.prepare_context(format='openai')
+        context[0]['content'] += ' INJECTED'
+
+        assert memory.prepare_context(format='openai') == [{'role': 'user', 'content': 'hi'}]
+
 
 # ============================================================================
 # Render Tests
@@ -1226,6 +1483,38 @@ class TestRender:
         
         assert isinstance(result, str)
 
+    def test_render_conversation_keeps_most_recent_within_budget(self, memory):
+        """
+        format='conversation' must keep the newest messages that fit.
+
+        When max_total_length is exceeded, older messages are dropped and
+        the most recent ones are kept whole, in chronological order.
+
+        Remove this test if: We change conversation truncation.
+        """
+        for i in range(10):
+            memory.add_msg('user', f'Message {i}', channel='webapp')
+
+        result = memory.render(format='conversation', max_total_length=50)
+
+        assert result == 'User: Message 8\n\nUser: Message 9'
+
+    def test_render_conversation_truncates_message_at_budget_boundary(self, memory):
+        """
+        A message that only partly fits must be truncated, not dropped.
+
+        Otherwise a single long newest message yields an empty context.
+
+        Remove this test if: We change conversation truncation.
+        """
+        memory.add_msg('user', 'Short question', channel='webapp')
+        memory.add_msg('assistant', 'x' * 5000, channel='webapp')
+
+        result = memory.render(format='conversation', max_message_length=1000, max_total_length=1000)
+
+        assert result.startswith('Assistant: xxx')
+        assert len(result) <= 1000
+
     def test_render_json_format(self, populated_memory):
         """
         render with format='json' must return valid JSON.
@@ -1259,6 +1548,25 @@ class TestRender:
         assert 'User says hi' in result or 'USER' in result
         # Assistant message should not be in filtered output
 
+    def test_render_time_range_filters_on_repeated_calls(self, memory):
+        """
+        render must apply time_range the same way on every call.
+
+        Parsed timestamps are cached per memory; a cached parse must give
+        the same result as a fresh one.
+
+        Remove this test if: We remove time_range filtering.
+        """
+        import datetime as dtt
+        memory.add_msg('user', 'Inside the range', channel='webapp')
+        dt = dtt.datetime.fromisoformat(memory.last_user_msg()['dt_utc'])
+        inside = (dt - dtt.timedelta(minutes=1), dt + dtt.timedelta(minutes=1))
+        after = (dt + dtt.timedelta(minutes=1), None)
+
+        for _ in range(2):
+            assert 'Inside the range' in memory.render(format='plain', time_range=inside)
+            assert 'Inside the range' not in memory.render(format='plain', time_range=after)
+
 
 # ============================================================================
 # Get Events Tests
@@ -1323,6 +1631,24 @@ class TestGetEvents:
         
         assert stamps == sorted(stamps)
 
+    def test_get_events_orders_out_of_order_timestamps(self, memory):
+        """
+        An event stored with an earlier timestamp must still read back in order.
+        
+        Reads walk the events dict directly, so it has to be re-sorted when
+        an event lands before the current tail.
+        
+        Remove this test if: We change ordering.
+        """
+        memory.add_log('Second')
+        memory.add_log('Third')
+        early = dict(memory.get_logs()[0], stamp='0' * 16, content='First',
+                     dt_utc='2000-01-01 00:00:00.000')
+        memory._store_event('log', early)
+        
+        assert [e['content'] for e in memory.get_events()] == ['First', 'Second', 'Third']
+        assert [e['content'] for e in memory.get_logs(limit=2)] == ['Second', 'Third']
+
     def test_get_events_respects_limit(self, memory):
         """
         get_events must respect the limit parameter.
@@ -258,6 +258,39 @@ class TestRetryLogic:
         
         assert llm.call_count == 1
 
+    def test_retries_work_with_two_argument_build_prompt_override(self, mock_llm, memory):
+        """
+        Subclasses overriding build_prompt(memory, context_vars) must retry.
+        
+        build_prompt is a public override point; retries must see the
+        repaired prompt through self.prompt without a new argument.
+        
+        Remove this test if: We change the build_prompt override contract.
+        """
+        seen = []
+
+        class LegacyThought(THOUGHT):
+            def build_prompt(self, memory, context_vars=None):
+                seen.append(self.prompt)
+                return self.prompt.upper()
+
+        llm = mock_llm(responses=["bad", "bad", "good"])
+        thought = LegacyThought(
+            name="test",
+            llm=llm,
+            prompt="Hello",
+            max_retries=3,
+            validation=lambda r: (r == "good", "not good"),
+        )
+        
+        thought(memory)
+        
+        assert llm.call_count == 3
+        assert memory.get_var("test_result") == "good"
+        assert seen[0] == "Hello"
+        assert all("not good" in p for p in seen[1:])
+        assert thought.prompt == "Hello"
+
 
 # ============================================================================
 # Memory Query Operation Tests
@@ -340,6 +373,172 @@ class TestThoughtSerialization:
         # Should have recorded execution
         assert len(thought.execution_history) > 0
 
+    def test_acall_runs_retries_without_blocking_the_loop(self):
+        """
+        acall must run thoughts off the event loop, including retries.
+
+        Two gathered runs of the same THOUGHT must overlap (each first
+        attempt waits for the other at a barrier), and the retry's repair
+        suffix must not leak into the shared thought's prompt.
+
+        Remove this test if: We remove async execution.
+        """
+        import asyncio
+        import threading
+        from thoughtflow import MEMORY
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        class RepairAwareLLM:
+            """Answers 'bad' until the prompt carries a repair suffix."""
+            def call(self, msgs, params=None):
+                if "your last answer failed" in msgs[-1]["content"]:
+                    return ["good"]
+                barrier.wait()  # raises BrokenBarrierError if runs are serial
+                return ["bad"]
+
+        thought = THOUGHT(
+            name="slow",
+            llm=RepairAwareLLM(),
+            prompt="Hello",
+            max_retries=2,
+            validation=lambda r: (r == "good", "not good"),
+        )
+
+        async def run_both():
+            return await asyncio.gather(thought.acall(MEMORY()), thought.acall(MEMORY()))
+
+        memories = asyncio.run(run_both())
+
+        assert [m.get_var("slow_result") for m in memories] == ["good", "good"]
+        assert thought.prompt == "Hello"
+
+    def test_execution_history_is_capped(self, mock_llm, memory):
+        """
+        THOUGHT must keep only the newest history_max executions.
+
+        Long-running agents would otherwise grow the history without bound.
+
+        Remove this test if: We remove the history cap.
+        """
+        thought = THOUGHT(name="test", llm=mock_llm(), prompt="Hello", history_max=2)
+
+        for _ in range(4):
+            thought(memory)
+
+        assert len(thought.execution_history) == 2
+        assert isinstance(thought.execution_history, list)
+
+    def test_exact_cache_skips_repeated_llm_calls(self, mock_llm):
+        """
+        cache_mode='exact' must reuse the response for identical context.
+
+        Replaying a thought on the same context should not pay for the same
+        LLM round-trip twice.
+
+        Remove this test if: We remove the THOUGHT response cache.
+        """
+        llm = mock_llm(responses=["cached answer"])
+        thought = THOUGHT(name="test", llm=llm, prompt="Hello", cache_mode="exact")
+
+        first = thought(MEMORY())
+        second = thought(MEMORY())
+
+        assert llm.call_count == 1
+        assert first.get_var("test_result") == second.get_var("test_result") == "cached answer"
+
+        thought.clear_cache()
+        thought(MEMORY())
+        assert llm.call_count == 2
+
+    def test_exact_cache_hits_for_dict_prompts(self, mock_llm):
+        """
+        The cache key must ignore construct_prompt's random marker stamp.
+
+        Dict prompts get a fresh stamp on every build; keying on the raw text
+        would miss every time and grow the cache without bound.
+
+        Remove this test if: We remove the THOUGHT response cache.
+        """
+        llm = mock_llm(responses=["cached answer"])
+        thought = THOUGHT(name="test", llm=llm, prompt={"task": "Say hi"}, cache_mode="exact")
+
+        thought(MEMORY())
+        thought(MEMORY())
+
+        assert llm.call_count == 1
+        assert len(thought._response_cache) == 1
+
+    def test_exact_cache_is_bounded_and_keyed_by_llm(self, mock_llm):
+        """
+        The cache must evict past cache_size and miss after the LLM changes.
+
+        Remove this test if: We remove the THOUGHT response cache.
+        """
+        llm = mock_llm()
+        thought = THOUGHT(name="test", llm=llm, prompt="Hello {x}", cache_mode="exact", cache_size=2)
+
+        for x in ("a", "b", "c"):
+            thought(MEMORY(), vars={"x": x})
+        assert len(thought._response_cache) == 2
+
+        other = mock_llm()
+        other.model = "other-model"
+        thought.llm = other
+        thought(MEMORY(), vars={"x": "c"})
+        assert other.call_count == 1
+
+    def test_exact_cache_skips_empty_responses(self, mock_llm):
+        """
+        A failed (empty) LLM response must not be cached.
+
+        LLM.call returns [] on an HTTP error, which run_llm turns into "";
+        caching it would replay the failure on every later run.
+
+        Remove this test if: We remove the THOUGHT response cache.
+        """
+        llm = mock_llm(responses=["", "ok"])
+        thought = THOUGHT(name="test", llm=llm, prompt="Hello", cache_mode="exact")
+
+        first = thought(MEMORY())
+        second = thought(MEMORY())
+
+        assert llm.call_count == 2
+        assert first.get_var("test_result") == ""
+        assert second.get_var("test_result") == "ok"
+        assert len(thought._response_cache) == 1
+
+    def test_exact_cache_stores_only_validated_responses(self, mock_llm):
+        """
+        Responses that fail validation must not be cached.
+
+        Only the response that finally validates is stored, under the first
+        attempt's key, so the next run with the same context reuses it.
+
+        Remove this test if: We remove the THOUGHT response cache.
+        """
+        llm = mock_llm(responses=["bad", "bad", "good"])
+        thought = THOUGHT(
+            name="test", llm=llm, prompt="Hello", cache_mode="exact", max_retries=2,
+            validation=lambda r: (r == "good", "not good"),
+        )
+
+        assert thought(MEMORY()).get_var("test_result") is None
+        assert thought(MEMORY()).get_var("test_result") == "good"
+        assert llm.call_count == 3
+        assert thought(MEMORY()).get_var("test_result") == "good"
+        assert llm.call_count == 3
+        assert len(thought._response_cache) == 1
+
+    def test_cache_mode_rejects_unknown_values(self, mock_llm):
+        """
+        THOUGHT must reject cache modes it does not implement.
+
+        Remove this test if: We add more cache modes.
+        """
+        with pytest.raises(ValueError):
+            THOUGHT(name="test", llm=mock_llm(), prompt="Hello", cache_mode="fuzzy")
+
 
 # ============================================================================
 # Configuration Tests
@@ -503,6 +702,29 @@ class TestHooks:
         
         assert thought.post_hook is my_hook
 
+    def test_non_callable_hooks_assigned_later_are_ignored(self, mock_llm):
+        """
+        Hooks set after construction must be validated on assignment.
+        
+        A non-callable pre_hook/post_hook is stored as None, as it is when
+        passed to __init__, rather than raising mid-execution.
+        
+        Remove this test if: We stop ignoring non-callable hooks.
+        """
+        thought = THOUGHT(
+            name="test",
+            llm=mock_llm(responses=["Hi there"]),
+            prompt="Hello",
+        )
+        thought.pre_hook = "not a function"
+        thought.post_hook = 42
+        
+        assert thought.pre_hook is None
+        assert thought.post_hook is None
+        memory = thought(MEMORY())
+        
+        assert memory.get_var("test_result") == "Hi there"
+
 
 # ============================================================================
 # DECIDE Class Tests
@@ -29,10 +29,17 @@ from thoughtflow._util import (
     ValidExtractError,
     VAR_DELETED,
     compress_to_json,
+    compress_encoded,
+    encode_value,
+    iter_decompressed,
+    decompress_head_tail,
     decompress_from_json,
     estimate_size,
     is_obj_ref,
     truncate_content,
+    json_dumps_bytes,
+    json_dumps_document,
+    json_loads_bytes,
 )
 
 
@@ -106,6 +113,55 @@ class TestEventStamp:
         stamps = [EventStamp.stamp() for _ in range(100)]
         assert len(stamps) == len(set(stamps))  # All unique
 
+    def test_stamps_sort_in_creation_order(self):
+        """
+        Stamps generated back-to-back must sort in creation order.
+        
+        Many stamps land in the same 0.1 ms tick; the tick is bumped so
+        MEMORY's append-only indexes and replay ordering stay chronological.
+        
+        Remove this test if: We stop guaranteeing monotonic stamps.
+        """
+        stamps = [EventStamp.stamp("same doc") for _ in range(200)]
+        assert stamps == sorted(stamps)
+        assert len(set(stamps)) == 200
+
+    def test_stamp_batch_returns_unique_stamps(self):
+        """
+        stamp_batch(n) must return n distinct, well-formed stamps.
+        
+        Each stamp gets its own reserved tick, so uniqueness holds even
+        against stamps made concurrently with stamp().
+        
+        Remove this test if: We remove stamp_batch.
+        """
+        before = EventStamp.stamp()
+        stamps = EventStamp.stamp_batch(500)
+        after = EventStamp.stamp()
+        assert len(stamps) == 500
+        assert len(set(stamps)) == 500
+        assert all(len(s) == 16 for s in stamps)
+        assert before < stamps[0] and stamps[-1] < after
+
+    def test_stamp_batch_is_ordered_and_scales_past_suffix_space(self, monkeypatch):
+        """
+        stamp_batch must sort in creation order and finish for large n.
+        
+        More stamps than the 3-char random suffix can distinguish (62**3)
+        must still be unique, without retry loops.
+        
+        Remove this test if: We remove stamp_batch.
+        """
+        from thoughtflow import _util
+        # The batch reserves ~24 s of ticks; restore the tick afterwards so
+        # later tests' stamps still decode to the wall-clock time.
+        monkeypatch.setattr(_util, "_last_tick", _util._last_tick)
+        n = 62 ** 3 + 1000
+        stamps = EventStamp.stamp_batch(n)
+        assert len(stamps) == n
+        assert stamps == sorted(stamps)
+        assert len(set(stamps)) == n
+
     def test_hashify_is_deterministic(self):
         """
         hashify() must return the same hash for the same input every time.
@@ -133,6 +189,18 @@ class TestEventStamp:
             hash_result = EventStamp.hashify("test", length=length)
             assert len(hash_result) == length
 
+    def test_hashify_output_is_stable_across_releases(self):
+        """
+        hashify() must keep producing the same digest for a known input.
+        
+        Record/replay exchange keys are hashify() digests persisted inside
+        saved memories, so swapping the underlying hash function (even for
+        a faster one) would silently orphan every recorded session.
+        
+        Remove this test if: We ship a migration for recorded exchange keys.
+        """
+        assert EventStamp.hashify("thoughtflow") == "qXURir2LT2VVonTbedSrDq4tIjZpKn6y"
+
     def test_encode_decode_roundtrip(self):
         """
         encode_num and decode_num must be inverse operations.
@@ -354,6 +422,49 @@ class TestConstructMsgs:
         
         assert 'Hello Alice' in result[-1]['content']
 
+    def test_substitutes_all_variables_in_one_pass(self):
+        """
+        construct_msgs must substitute every key, preferring the longest.
+        
+        Substitution is a single regex pass, so a key that is a prefix of
+        another key must not shadow the longer one.
+        
+        Remove this test if: We change the templating system.
+        """
+        result = construct_msgs(
+            usr_prompt='{name} / {name_full} / {age}',
+            vars={'{name}': 'Ada', '{name_full}': 'Ada Lovelace', '{age}': 36},
+            msgs=[],
+        )
+        
+        assert result[-1]['content'] == 'Ada / Ada Lovelace / 36'
+
+    def test_substituted_values_are_not_expanded_again(self):
+        """
+        A value containing another key must be inserted literally.
+        
+        Substitution is single-pass, so values never cascade into further
+        replacements (user text can't trigger template expansion).
+        
+        Remove this test if: We change the templating system.
+        """
+        result = construct_msgs(
+            usr_prompt='Hi {name}, {topic}',
+            vars={'{name}': 'Ada', '{topic}': 'about {name}'},
+            msgs=[],
+        )
+        
+        assert result[-1]['content'] == 'Hi Ada, about {name}'
+
+    def test_rejects_non_string_keys(self):
+        """
+        construct_msgs must raise TypeError for non-string vars keys.
+        
+        Remove this test if: We change the templating system.
+        """
+        with pytest.raises(TypeError):
+            construct_msgs(usr_prompt='Hello 1', vars={1: 'one'}, msgs=[])
+
     def test_preserves_existing_messages(self):
         """
         construct_msgs must preserve messages passed in the msgs parameter.
@@ -494,6 +605,21 @@ class TestValidExtract:
         result = valid_extract(text, rules)
         assert result == [1, 2, 3]
 
+    def test_validation_error_reports_element_path(self):
+        """
+        A failed validation must name the path of the offending element.
+        
+        Paths are built lazily on failure, so this guards that nested
+        keys and list indexes are still reported accurately.
+        
+        Remove this test if: We change validation error messages.
+        """
+        text = "{'nums': [1, 'two', 3]}"
+        rules = {'kind': 'python', 'format': {'nums': [int]}}
+        
+        with pytest.raises(ValidExtractError, match=r"\$\.nums\[1\]: expected int, got str"):
+            valid_extract(text, rules)
+
     def test_raises_on_invalid_parsing_rules(self):
         """
         valid_extract must raise ValidExtractError for invalid rules.
@@ -693,6 +819,97 @@ class TestCompression:
         
         assert compressed['size_compressed'] < compressed['size_original']
 
+    def test_any_compression_level_roundtrips(self):
+        """
+        Objects compressed at any zlib level must decompress identically.
+        
+        The level only trades CPU for ratio; stored objects written at the
+        old level 9 must keep loading under the new default.
+        
+        Remove this test if: We change compression algorithm.
+        """
+        original = "The quick brown fox. " * 500
+        for level in (1, 6, 9):
+            compressed = compress_to_json(original, level=level)
+            assert decompress_from_json(compressed) == original
+
+    def test_encode_value_matches_estimate_size(self):
+        """
+        encode_value must produce exactly estimate_size bytes and roundtrip.
+        
+        MEMORY.set_var measures and compresses the same encoded bytes.
+        
+        Remove this test if: We decouple set_var from encode_value.
+        """
+        for value in ("héllo " * 20, b"\x00\x01" * 10, {"k": ["ü", 1, None]}, {1, 2}):
+            raw, content_type = encode_value(value)
+            assert len(raw) == estimate_size(value)
+            
+            compressed = compress_encoded(raw, content_type)
+            assert compressed == compress_to_json(value)
+            assert decompress_from_json(compressed) == value
+
+    def test_incremental_decompression_matches_full(self):
+        """
+        iter_decompressed/decompress_head_tail must agree with full decompression.
+        
+        Small chunks force many base64/zlib steps, including bounded output
+        for highly compressible data.
+        
+        Remove this test if: We remove incremental decompression.
+        """
+        import random
+        rng = random.Random(7)
+        raw = bytes(rng.randrange(256) for _ in range(5000)) + b"a" * 20000
+        compressed = compress_to_json(raw)
+        
+        assert b"".join(iter_decompressed(compressed, chunk_size=64)) == raw
+        assert decompress_head_tail(compressed, 100, 50) == (raw[:100], raw[-50:])
+        assert decompress_head_tail(compressed, 100, 0) == (raw[:100], b"")
+
+    def test_objects_are_tagged_with_codec(self):
+        """
+        Compressed objects must record their codec; untagged ones are zlib.
+        
+        Objects saved before the tag existed must keep decoding.
+        
+        Remove this test if: We drop codec tagging.
+        """
+        compressed = compress_to_json("hello world " * 50)
+        assert compressed['codec'] == 'zlib'
+        
+        legacy = {k: v for k, v in compressed.items() if k != 'codec'}
+        assert decompress_from_json(legacy) == "hello world " * 50
+        
+        with pytest.raises(ValueError):
+            compress_to_json("data", codec='lz4')
+
+    def test_zstd_codec_roundtrip(self):
+        """
+        codec='zstd' must roundtrip when the zstandard package is installed.
+        
+        Remove this test if: We drop zstd support.
+        """
+        pytest.importorskip("zstandard")
+        original = {"rows": list(range(500))}
+        compressed = compress_to_json(original, codec='zstd')
+        
+        assert compressed['codec'] == 'zstd'
+        assert decompress_from_json(compressed) == original
+
+    def test_binary_mode_skips_base64(self):
+        """
+        binary=True must store raw compressed bytes that still roundtrip.
+        
+        Remove this test if: We remove the binary option.
+        """
+        original = {"rows": list(range(500))}
+        compressed = compress_to_json(original, binary=True)
+        
+        assert isinstance(compressed['data'], bytes)
+        assert len(compressed['data']) == compressed['size_compressed']
+        assert decompress_from_json(compressed) == original
+
     def test_compressed_output_is_json_serializable(self):
         """
         compress_to_json output must be JSON-serializable.
@@ -770,6 +987,61 @@ class TestEstimateSize:
         assert size == len(json.dumps(data).encode('utf-8'))
 
 
+class TestJsonDumpsBytes:
+    """
+    Tests for json_dumps_bytes, the request-body serializer.
+    """
+
+    def test_returns_utf8_json_bytes(self):
+        """
+        json_dumps_bytes must return bytes that round-trip through json.loads.
+        
+        Remove this test if: We stop sending JSON request bodies.
+        """
+        import json
+        payload = {"model": "m", "messages": [{"role": "user", "content": "héllo"}]}
+        data = json_dumps_bytes(payload)
+        assert isinstance(data, bytes)
+        assert json.loads(data.decode("utf-8")) == payload
+
+    def test_handles_non_string_keys(self):
+        """
+        Payloads orjson rejects must still serialize via stdlib json.
+        
+        Remove this test if: We drop the stdlib fallback.
+        """
+        import json
+        assert json.loads(json_dumps_bytes({1: "a"})) == {"1": "a"}
+
+    def test_document_keeps_unicode_and_any_indent(self):
+        """
+        json_dumps_document must write raw UTF-8 and honour any indent.
+        
+        MEMORY.to_json writes its bytes straight to disk.
+        
+        Remove this test if: We stop using json_dumps_document for to_json.
+        """
+        import json
+        doc = {"text": "héllo ☃", "n": [1, 2], 3: "int key"}
+        for indent in (None, 2, 4):
+            data = json_dumps_document(doc, indent=indent)
+            assert "héllo ☃".encode("utf-8") in data
+            assert json.loads(data) == {"text": "héllo ☃", "n": [1, 2], "3": "int key"}
+        assert b"\n    " in json_dumps_document(doc, indent=4)
+
+    def test_loads_parses_bytes_and_rejects_non_json(self):
+        """
+        json_loads_bytes must parse UTF-8 bytes and raise ValueError otherwise.
+        
+        LLM._parse_response relies on ValueError to wrap non-JSON bodies.
+        
+        Remove this test if: We stop parsing response bodies from bytes.
+        """
+        assert json_loads_bytes('{"t": "héllo"}'.encode("utf-8")) == {"t": "héllo"}
+        with pytest.raises(ValueError):
+            json_loads_bytes(b"<html>Bad Gateway</html>")
+
+
 class TestIsObjRef:
     """
     Tests for the is_obj_ref utility function.